@@ -23,7 +23,7 @@ from six.moves import configparser
 
 from mos_tests.environment.devops_client import DevopsClient
 from mos_tests.environment.fuel_client import FuelClient
-from mos_tests.functions.common import gen_temp_file
+from mos_tests.functions.common import get_cert_file
 from mos_tests.functions.common import get_os_conn
 from mos_tests.functions.common import wait
 from mos_tests.functions import os_cli
@@ -31,6 +31,12 @@ from mos_tests.settings import KEYSTONE_PASS
 from mos_tests.settings import KEYSTONE_USER
 from mos_tests.settings import SERVER_ADDRESS
 from mos_tests.settings import SSH_CREDENTIALS
+from plugins.env_requirements import check_env_requirements
+from plugins.env_requirements import deselect_unsupported
+from plugins.env_requirements import env_checks_cache
+from plugins.env_requirements import get_editable_settings
+from plugins.revert_scheduler import can_share_revert
+from plugins.revert_scheduler import stats as revert_stats
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +44,9 @@ logger = logging.getLogger(__name__)
 # Define pytest plugins to use
 pytest_plugins = ("plugins.incremental",
                   "plugins.testrail_id",
-                  "plugins.fuel_snapshot")
+                  "plugins.fuel_snapshot",
+                  "plugins.wait_profile",
+                  "plugins.revert_scheduler")
 
 
 def pytest_addoption(parser):
@@ -50,6 +58,9 @@ def pytest_addoption(parser):
                      help="Fuel devops snapshot name")
     parser.addoption("--cluster", '-C', action="append",
                      help="Fuel cluster name to test on it")
+    parser.addoption("--deselect-by-env", action="store_true",
+                     help="Deselect tests, which env doesn't meet "
+                          "check_env_ requirements, on collection")
 
 
 def pytest_configure(config):
@@ -84,6 +95,33 @@ def pytest_runtest_teardown(item, nextitem):
     setattr(item.session, "nextitem", nextitem)
 
 
+def get_collection_env(config):
+    """Returns env to check tests requirements before session start"""
+    fuel_ip = config.getoption("--fuel-ip")
+    if not fuel_ip:
+        fuel_ip = DevopsClient.get_admin_node_ip(
+            env_name=config.getoption("--env"))
+    if not fuel_ip:
+        fuel_ip = SERVER_ADDRESS
+    fuel = get_fuel_client(fuel_ip)
+    names = config.getoption('--cluster')
+    if not names:
+        return fuel.get_last_created_cluster()
+    return fuel.get_clustres_by_names(names)[0]
+
+
+def pytest_collection_modifyitems(session, config, items):
+    if not config.getoption("--deselect-by-env"):
+        return
+    try:
+        env = get_collection_env(config)
+    except Exception as e:
+        logger.warning("Can't get env to check tests requirements, they "
+                       "will be checked before each test: {}".format(e))
+        return
+    deselect_unsupported(config, items, env, globals())
+
+
 @pytest.fixture
 def suffix():
     return str(uuid.uuid4())
@@ -118,6 +156,8 @@ def fuel_master_ip(request, env_name, snapshot_name):
 def revert_snapshot(env_name, snapshot_name):
     DevopsClient.revert_snapshot(env_name=env_name,
                                  snapshot_name=snapshot_name)
+    # Nodes and settings may be changed by test
+    env_checks_cache.clear()
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -153,11 +193,25 @@ def cleanup(request, env_name, snapshot_name):
         return
     skipped = any(x for x in test_results if x is not None and x.skipped)
     destructive = 'undestructive' not in item.keywords
+    # Env may be left unreverted by previous test of same revert group
+    revert_pending = getattr(item.session, 'revert_pending', False)
     reverted = False
-    if destructive and not skipped:
-        if all([env_name, snapshot_name]):
-            revert_snapshot(env_name, snapshot_name)
-            reverted = True
+    if all([env_name, snapshot_name]):
+        if destructive and not skipped:
+            revert_stats.needed += 1
+        if (destructive and not skipped) or revert_pending:
+            nextitem = getattr(item.session, 'nextitem', None)
+            # env left by failed test is not trusted by the next one
+            if not failed and can_share_revert(item, nextitem):
+                logger.info('Env is not reverted for the next test of '
+                            'the same revert group')
+                revert_pending = True
+            else:
+                revert_snapshot(env_name, snapshot_name)
+                revert_stats.reverts += 1
+                reverted = True
+                revert_pending = False
+    setattr(request.session, 'revert_pending', revert_pending)
     setattr(request.session, 'reverted', reverted)
 
     # reinitialize fixtures
@@ -188,9 +242,7 @@ def credentials(setup_session, fuel_master_ip):
         path_to_cert = None
     else:
         keystone_url = 'https://{0}:5000/v2.0/'.format(controller_ip)
-        with gen_temp_file(prefix="fuel_cert_", suffix=".pem") as f:
-            f.write(cert)
-        path_to_cert = f.name
+        path_to_cert = get_cert_file(cert)
     return Credentials(fuel_ip=fuel_master_ip,
                        controller_ip=controller_ip,
                        keystone_url=keystone_url,
@@ -211,9 +263,8 @@ def restart_ceph(env):
     if len(ceph_nodes) == 0:
         return
     controllers = env.get_nodes_by_role('controller')
-    for node in set(ceph_nodes) | set(controllers):
-        with node.ssh() as remote:
-            remote.execute('restart ceph-all')
+    nodes = {x.data['ip']: x for x in ceph_nodes + controllers}
+    env.execute_on_nodes(nodes.values(), 'restart ceph-all')
 
 
 @pytest.fixture(scope='session')
@@ -231,7 +282,7 @@ def env(request, fuel):
     assert env.is_operational
     if getattr(request.session, 'reverted', True):
         restart_ceph(env)
-        env.wait_for_ostf_pass()
+        env.wait_for_healthy()
         wait(env.os_conn.is_nova_ready,
              timeout_seconds=60 * 5,
              expected_exceptions=Exception,
@@ -358,44 +409,44 @@ def get_config_option(fp, key, res_type):
 
 def is_l2pop(env):
     """Env deployed with vxlan segmentation and l2 population"""
-    data = env.get_settings_data()['editable']
+    data = get_editable_settings(env)
     return data['neutron_advanced_configuration']['neutron_l2_pop']['value']
 
 
 def is_dvr(env):
     """Env deployed with enabled distributed routers support"""
-    data = env.get_settings_data()['editable']
+    data = get_editable_settings(env)
     return data['neutron_advanced_configuration']['neutron_dvr']['value']
 
 
 def is_l3_ha(env):
     """Env deployed with enabled distributed routers support"""
-    data = env.get_settings_data()['editable']
+    data = get_editable_settings(env)
     return data['neutron_advanced_configuration']['neutron_l3_ha']['value']
 
 
 def is_ironic_enabled(env):
-    data = env.get_settings_data()['editable']['additional_components']
+    data = get_editable_settings(env)['additional_components']
     return data['ironic']['value']
 
 
 def is_ceph_enabled(env):
-    data = env.get_settings_data()['editable']['storage']
+    data = get_editable_settings(env)['storage']
     return data['volumes_ceph']['value']
 
 
 def is_qos_enabled(env):
-    data = env.get_settings_data()['editable']
+    data = get_editable_settings(env)
     return data['neutron_advanced_configuration']['neutron_qos']['value']
 
 
 def is_radosgw_enabled(env):
-    data = env.get_settings_data()['editable']['storage']
+    data = get_editable_settings(env)['storage']
     return data['objects_ceph']['value']
 
 
 def is_kvm(env):
-    data = env.get_settings_data()['editable']
+    data = get_editable_settings(env)
     return data['common']['libvirt_type']['value'] == 'kvm'
 
 
@@ -411,35 +462,12 @@ def executable_requirements(request, env_name):
 
 @pytest.fixture(autouse=True)
 def env_requirements(request, env):
-    reserved = {'or', 'and', 'not', '(', ')'}
     marker = request.node.get_marker('check_env_')
     if not marker:
         return
-    marker_str = ' and '.join(marker.args)
-    marker_str = marker_str.replace(
-        '(', ' ( '
-    ).replace(
-        ')', ' ) '
-    ).replace(
-        '  ', ' ')
-    functions = marker_str.split()
-    marker_str_evalued = marker_str
-    for func in functions:
-        if func in reserved:
-            continue
-        function = globals().get(func)
-        if function is None:
-            logger.critical('Guard with name {} not found'.format(func))
-            raise ValueError('Parse error')
-        if not (func.startswith('is_') or func.startswith('has_')):
-            logger.critical(
-                'Guard must start with "is_" or "has_", got {} instead'.format(
-                    func))
-            raise ValueError('Parse error')
-        marker_str_evalued = marker_str_evalued.replace(
-            func, str(function(env)))
-
-    if not eval(marker_str_evalued):
+    is_met, marker_str, marker_str_evalued = check_env_requirements(
+        env, marker.args, globals())
+    if not is_met:
         pytest.skip('Requires criteria: {}, computed instead: {}'.format(
             marker_str, marker_str_evalued))
 
@@ -17,6 +17,11 @@ import logging
 from devops.models import Environment
 from devops.models import Interface
 
+from mos_tests.environment.fuel_client import NodeInventory
+from mos_tests.environment.ssh import SFTPTransfer
+from mos_tests.environment.ssh import ssh_pool
+from mos_tests.environment.token_cache import token_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -132,6 +137,13 @@ class EnvProxy(object):
     def revert_snapshot(self, snapshot_name):
         try:
             logger.info("Reverting snapshot {0}".format(snapshot_name))
+            # All pooled connections and uploaded files are lost after revert
+            ssh_pool.clear()
+            SFTPTransfer.clear_manifests()
+            # Tokens issued after snapshot was made are unknown for Keystone
+            token_cache.clear()
+            # Nodes may be added or removed after snapshot was made
+            NodeInventory.invalidate_all()
             self.revert(snapshot_name, flag=False)
             self.resume(verbose=False)
             self.sync_time()
@@ -12,9 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import namedtuple
 from itertools import groupby
 import logging
 import os
+import threading
+import time
 
 import dpath.util
 from fuelclient import client
@@ -26,7 +29,10 @@ from fuelclient.objects import task as fuel_task
 from paramiko import RSAKey
 from paramiko import ssh_exception
 
+from mos_tests.environment.health_gate import run_health_checks
 from mos_tests.environment.os_actions import OpenStackActions
+from mos_tests.environment.ssh import execute_on_remotes
+from mos_tests.environment.ssh import ssh_pool
 from mos_tests.environment.ssh import SSHClient
 from mos_tests.functions.common import gen_temp_file
 from mos_tests.functions.common import wait
@@ -66,7 +72,8 @@ class NodeProxy(object):
         return SSHClient(
             host=self.data['ip'],
             username='root',
-            private_keys=self._env.admin_ssh_keys
+            private_keys=self._env.admin_ssh_keys,
+            pool=ssh_pool
         )
 
     def is_ssh_avaliable(self):
@@ -85,15 +92,65 @@ class NodeProxy(object):
                 for x in interfaces}
 
 
+ControllerRoles = namedtuple('ControllerRoles', ['primary', 'non_primary'])
+
+
+class NodeInventory(object):
+    """Snapshot of environment nodes indexed by role, fqdn, ip and mac
+
+    All inventories are outdated by `invalidate_all` (after snapshot
+    revert, for example).
+
+    :param nodes: list of NodeProxy
+    """
+
+    _generation = 0
+    _lock = threading.Lock()
+
+    def __init__(self, nodes):
+        self.taken_at = time.time()
+        self.generation = self._generation
+        self.by_fqdn = {}
+        self.by_ip = {}
+        self.by_mac = {}
+        self.by_role = {}
+        for node in nodes:
+            self.by_fqdn[node.data['fqdn']] = node
+            for ip in [node.data['ip']] + node.ip_list:
+                self.by_ip[ip] = node
+            self.by_mac[node.data['mac']] = node
+            for role in node.data['roles']:
+                self.by_role.setdefault(role, []).append(node)
+        # Ids of (primary, non primary) controllers, discovered by
+        # Environment.get_controller_roles
+        self.controller_roles = None
+
+    @classmethod
+    def invalidate_all(cls):
+        with cls._lock:
+            NodeInventory._generation += 1
+
+    def is_expired(self, ttl):
+        return (self.generation != self._generation or
+                time.time() - self.taken_at > ttl)
+
+
 class Environment(environment.Environment):
     """Extended fuelclient Environment model with some helpful methods"""
 
     admin_ssh_keys = None
     _admin_ssh_keys_paths = None
 
+    # Max age (in seconds) of nodes inventory. Nodes returned by
+    # get_nodes_by_role and find_node_by_* are taken from it, so their data
+    # (online, status, etc.) may be so old; get_all_nodes returns actual
+    # nodes. Inventory is dropped by helpers, which power nodes on and off.
+    nodes_cache_ttl = 10
+
     def __init__(self, *args, **kwargs):
         super(Environment, self).__init__(*args, **kwargs)
         self._os_conn = None
+        self._inventory = None
 
     @property
     def os_conn(self):
@@ -119,8 +176,36 @@ class Environment(environment.Environment):
         return self._admin_ssh_keys_paths
 
     def get_all_nodes(self):
+        """Returns actual nodes (and refreshes nodes inventory)"""
         nodes = super(Environment, self).get_all_nodes()
-        return [NodeProxy(x, self) for x in nodes]
+        nodes = [NodeProxy(x, self) for x in nodes]
+        inventory = NodeInventory(nodes)
+        previous = self._inventory
+        if (previous is not None and
+                previous.generation == inventory.generation):
+            # nodes are not changed, so their roles are kept
+            inventory.controller_roles = previous.controller_roles
+        self._inventory = inventory
+        return nodes
+
+    @property
+    def inventory(self):
+        """Cached nodes inventory
+
+        It is refreshed after `nodes_cache_ttl` seconds, so nodes statuses
+        should be checked by `get_all_nodes`.
+
+        :rtype: NodeInventory
+        """
+        inventory = self._inventory
+        if inventory is None or inventory.is_expired(self.nodes_cache_ttl):
+            self.get_all_nodes()
+            inventory = self._inventory
+        return inventory
+
+    def invalidate_nodes(self):
+        """Drop nodes inventory (after nodes changes)"""
+        self._inventory = None
 
     def get_primary_controller_ip(self):
         """Return public ip of primary controller"""
@@ -128,18 +213,42 @@ class Environment(environment.Environment):
 
     def find_node_by_fqdn(self, fqdn):
         """Returns list of fuelclient.objects.Node instances for cluster"""
-        for node in self.get_all_nodes():
-            if node.data['fqdn'] == fqdn:
-                return node
-        raise Exception("Node doesn't found")
+        node = self.inventory.by_fqdn.get(fqdn)
+        if node is None:
+            raise Exception("Node doesn't found")
+        return node
+
+    def find_node_by_ip(self, ip):
+        """Returns node by any of its ip addresses or None"""
+        return self.inventory.by_ip.get(ip)
+
+    def find_node_by_mac(self, mac):
+        """Returns node by admin interface mac address or None"""
+        return self.inventory.by_mac.get(mac)
 
     def get_ssh_to_node(self, ip):
         return SSHClient(
             host=ip,
             username='root',
-            private_keys=self.admin_ssh_keys
+            private_keys=self.admin_ssh_keys,
+            pool=ssh_pool
         )
 
+    def execute_on_nodes(self, nodes, commands, concurrency=10,
+                         timeout=None, verbose=True):
+        """Execute command(s) on nodes simultaneously
+
+        :param nodes: list of NodeProxy
+        :param commands: command or list of commands
+        :param concurrency: max count of nodes to execute simultaneously
+        :param timeout: execution timeout for each node
+        :rtype: mos_tests.environment.ssh.MultiCommandResult
+        :return: results for each node keyed by node ip
+        """
+        return execute_on_remotes([x.ssh() for x in nodes], commands,
+                                  concurrency=concurrency, timeout=timeout,
+                                  verbose=verbose)
+
     def get_ssh_to_vm(self, ip, username=None, password=None,
                       private_keys=None, **kwargs):
         return SSHClient(
@@ -148,8 +257,7 @@ class Environment(environment.Environment):
 
     def get_nodes_by_role(self, role):
         """Returns nodes by assigned role"""
-        return [x for x in self.get_all_nodes()
-                if role in x.data['roles']]
+        return list(self.inventory.by_role.get(role, []))
 
     def get_tests(self):
         return self.connection.get_request('tests/{0}'.format(self.id),
@@ -204,9 +312,25 @@ class Environment(environment.Environment):
             return self.is_last_test_result_ok()
 
         wait(run_tests_and_wailt_result, timeout_seconds=timeout_seconds,
-             sleep_seconds=20,
              waiting_for='OpenStack to pass OSTF tests')
 
+    def wait_for_healthy(self, timeout_seconds=5 * 60):
+        """Wait env to pass fast health checks
+
+        Checks (see `mos_tests.environment.health_gate`) are run
+        simultaneously, OSTF tests are run only if any of them is failed
+        (checks are stopped as soon as one of them is failed definitely).
+
+        :returns: list of HealthCheckResult
+        """
+        results = run_health_checks(self, timeout_seconds=timeout_seconds)
+        failed = [x.name for x in results if x.passed is False]
+        if failed:
+            logger.warning('Health checks {0} are failed, fall back to '
+                           'OSTF'.format(failed))
+            self.wait_for_ostf_pass()
+        return results
+
     def wait_network_verification(self):
         data = self.verify_network()
         t = fuel_task.Task(data['id'])
@@ -248,6 +372,42 @@ class Environment(environment.Environment):
     def ssl_hostname(self):
         return dpath.util.get(self.ssl_config, '/hostname/value')
 
+    def get_controller_roles(self, refresh=False):
+        """Returns primary and non primary controllers
+
+        Roles are discovered on all controllers simultaneously and cached
+        until nodes inventory is invalidated (after revert, for example).
+        Pacemaker leader (DC) is not cached, because it moves on failover.
+
+        :param refresh: discover roles again
+        :rtype: ControllerRoles
+        """
+        controllers = self.get_nodes_by_role('controller')
+        inventory = self.inventory
+        if inventory.controller_roles is None or refresh:
+            results = self.execute_on_nodes(controllers, 'hiera roles',
+                                            verbose=False)
+            primary = None
+            for controller in controllers:
+                result = results[controller.data['ip']]
+                if result['exit_code'] != 0:
+                    continue
+                roles = ' '.join(result['stdout'])
+                logger.debug('hiera roles for {} is {}'.format(
+                    controller.data['fqdn'], roles))
+                if 'primary-controller' in roles:
+                    primary = controller
+            if primary is None:
+                raise Exception("Can't find primary controller")
+            non_primary = sorted((x for x in controllers if x != primary),
+                                 key=lambda node: node.data['fqdn'])
+            inventory.controller_roles = (primary.id,
+                                          [x.id for x in non_primary])
+        primary_id, non_primary_ids = inventory.controller_roles
+        nodes = {x.id: x for x in controllers}
+        return ControllerRoles(nodes[primary_id],
+                               [nodes[x] for x in non_primary_ids])
+
     @property
     def leader_controller(self):
         controllers = self.get_nodes_by_role('controller')
@@ -262,31 +422,18 @@ class Environment(environment.Environment):
 
     @property
     def primary_controller(self):
-        controllers = self.get_nodes_by_role('controller')
-        for controller in controllers:
-            with controller.ssh() as remote:
-                response = remote.execute('hiera roles')
-                stdout = ' '.join(response['stdout'])
-                logger.debug('hiera roles for {} is {}'.format(
-                    controller.data['fqdn'], stdout))
-                if 'primary-controller' in stdout:
-                    return controller
-        else:
-            raise Exception("Can't find primary controller")
+        return self.get_controller_roles().primary
 
     @property
     def non_primary_controllers(self):
-        controllers = self.get_nodes_by_role('controller')
-        primary_controller = self.primary_controller
-        non_primary_controllers = [
-            controller for controller in controllers
-            if controller != primary_controller]
-        non_primary_controllers.sort(key=lambda node: node.data['fqdn'])
-        return non_primary_controllers
+        return list(self.get_controller_roles().non_primary)
 
     def destroy_nodes(self, devops_nodes):
+        self.invalidate_nodes()
         node_ips = [node.get_ip_address_by_network_name('admin')
                     for node in devops_nodes]
+        for node_ip in node_ips:
+            ssh_pool.evict(node_ip)
         for node in devops_nodes:
             node.destroy()
         wait(lambda: self.check_nodes_get_offline_state(node_ips),
@@ -312,7 +459,9 @@ class Environment(environment.Environment):
         self.destroy_nodes(devops_nodes)
 
     def warm_start_nodes(self, devops_nodes):
+        self.invalidate_nodes()
         for node in devops_nodes:
+            ssh_pool.evict(node.get_ip_address_by_network_name('admin'))
             logger.info('Starting node {}'.format(node.name))
             node.create()
         wait(self.check_nodes_get_online_state, timeout_seconds=10 * 60)
@@ -337,12 +486,10 @@ class Environment(environment.Environment):
         return all([node.data['online'] for node in self.get_all_nodes()])
 
     def get_node_ip_by_host_name(self, hostname):
-        controller_ip = ''
-        for node in self.get_all_nodes():
-            if node.data['fqdn'] == hostname:
-                controller_ip = node.data['ip']
-                break
-        return controller_ip
+        node = self.inventory.by_fqdn.get(hostname)
+        if node is None:
+            return ''
+        return node.data['ip']
 
     def get_node_by_devops_node(self, devops_node, interface='admin'):
         interfaces = devops_node.interface_by_network_name(interface)
@@ -393,6 +540,7 @@ class Environment(environment.Environment):
             fuel_node.set({'name': devops_node.name})
 
         self.assign(fuel_nodes, roles)
+        self.invalidate_nodes()
 
 
 class FuelClient(object):
@@ -432,7 +580,8 @@ class FuelClient(object):
     def ssh_admin(self):
         return SSHClient(host=self.admin_ip,
                          username=self.ssh_login,
-                         password=self.ssh_password)
+                         password=self.ssh_password,
+                         pool=ssh_pool)
 
     @property
     def admin_keys(self):
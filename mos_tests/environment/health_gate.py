@@ -0,0 +1,202 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+import logging
+from multiprocessing.dummy import Pool
+import re
+import threading
+import time
+
+from keystoneclient.auth.identity.v2 import Password as KeystonePassword
+from waiting import TimeoutExpired
+
+from mos_tests.functions.common import wait
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheckFailed(Exception):
+    """Check is failed definitely, so waiting for it is useless"""
+
+
+# Pacemaker primitive line of `crm_mon -1 -r`, for example:
+#  p_haproxy	(ocf::fuel:ns_haproxy):	Started node-1.test.domain.local
+PACEMAKER_PRIMITIVE_RE = re.compile(
+    r'^\s*(?P<name>\S+)\s+\((?P<agent>\w+:[^)]*)\):\s*(?P<state>.*)$')
+
+
+def pacemaker_resources_started(env):
+    """All pacemaker primitives are started (as master or slave for
+    master-slave resources)
+
+    Stopped and failed primitives are expected to be started by pacemaker,
+    unmanaged ones are not.
+    """
+    controller = env.get_nodes_by_role('controller')[0]
+    with controller.ssh() as remote:
+        result = remote.execute('crm_mon -1 -r', verbose=False)
+    if not result.is_ok:
+        return False
+    started = True
+    unmanaged = []
+    for line in result.stdout_string.splitlines():
+        match = PACEMAKER_PRIMITIVE_RE.match(line)
+        if match is None:
+            continue
+        state = match.group('state')
+        if 'unmanaged' in state:
+            unmanaged.append('{0}: {1}'.format(match.group('name'), state))
+        elif state.split(' ', 1)[0] not in ('Started', 'Master', 'Slave'):
+            started = False
+    if unmanaged:
+        raise HealthCheckFailed('Pacemaker resources are unmanaged: '
+                                '{0}'.format(', '.join(unmanaged)))
+    return started
+
+
+def rabbitmq_cluster_assembled(env):
+    """All RabbitMQ cluster nodes are running without partitions"""
+    controller = env.get_nodes_by_role('controller')[0]
+    with controller.ssh() as remote:
+        result = remote.execute('rabbitmqctl cluster_status', verbose=False)
+    stdout = result.stdout_string.replace('\n', '').replace(' ', '')
+    if not result.is_ok or '{running_nodes,' not in stdout:
+        return False
+    if '{partitions,' in stdout and '{partitions,[]}' not in stdout:
+        raise HealthCheckFailed('RabbitMQ cluster is partitioned')
+    nodes = stdout.split('{nodes,', 1)[-1].split('{running_nodes,', 1)[0]
+    running_nodes = stdout.split('{running_nodes,', 1)[1].split(']', 1)[0]
+    return running_nodes.count('rabbit@') >= max(1, nodes.count('rabbit@'))
+
+
+def nova_computes_up(env):
+    """nova-compute is up on all compute nodes of env"""
+    hosts = set(x.data['fqdn'] for x in env.get_nodes_by_role('compute'))
+    services = env.os_conn.nova.services.list(binary='nova-compute')
+    up_hosts = set(x.host for x in services
+                   if x.state == 'up' and x.status == 'enabled')
+    return hosts <= up_hosts
+
+
+def neutron_agents_alive(env):
+    """Enabled neutron agents on nodes of env are alive"""
+    hosts = set(env.inventory.by_fqdn)
+    agents = env.os_conn.neutron.list_agents()['agents']
+    # agents of removed nodes are kept by neutron, they are ignored
+    agents = [x for x in agents if x['host'] in hosts and x['admin_state_up']]
+    return len(agents) > 0 and all(x['alive'] for x in agents)
+
+
+def keystone_issues_token(env):
+    """New token is issued (cached tokens are not used)"""
+    os_conn = env.os_conn
+    auth = KeystonePassword(username=os_conn.username,
+                            password=os_conn.password,
+                            tenant_name=os_conn.tenant,
+                            auth_url=os_conn.auth_url)
+    return auth.get_token(os_conn.session) is not None
+
+
+def glance_api_responds(env):
+    list(env.os_conn.glance.images.list(limit=1))
+    return True
+
+
+def cinder_api_responds(env):
+    env.os_conn.cinder.volumes.list(limit=1)
+    return True
+
+
+HEALTH_CHECKS = OrderedDict([
+    ('pacemaker', pacemaker_resources_started),
+    ('rabbitmq', rabbitmq_cluster_assembled),
+    ('nova-compute', nova_computes_up),
+    ('neutron-agents', neutron_agents_alive),
+    ('keystone', keystone_issues_token),
+    ('glance', glance_api_responds),
+    ('cinder', cinder_api_responds),
+])
+
+
+class HealthCheckResult(object):
+    """Outcome of single health check
+
+    :param name: check name
+    :param passed: is check passed before timeout (None if check is
+        stopped due to failure of other check)
+    :param latency: time (in seconds) until check is passed (or timed out)
+    """
+
+    def __init__(self, name, passed, latency):
+        self.name = name
+        self.passed = passed
+        self.latency = latency
+
+
+def run_health_checks(env, checks=None, timeout_seconds=5 * 60):
+    """Wait all health checks to pass simultaneously
+
+    Exceptions raised by checks (except HealthCheckFailed) are treated as
+    not passed check (service may be not ready yet). All checks are
+    stopped as soon as any of them is failed definitely.
+
+    :param checks: dict {name: function(env)}, HEALTH_CHECKS by default
+    :param timeout_seconds: timeout for each check
+    :returns: list of HealthCheckResult (`passed` is None for stopped
+        checks)
+    """
+    if checks is None:
+        checks = HEALTH_CHECKS
+    stopped = threading.Event()
+
+    def run_check(item):
+        name, check = item
+
+        def predicate():
+            if stopped.is_set():
+                return True
+            try:
+                return check(env)
+            except HealthCheckFailed:
+                raise
+            except Exception as e:
+                logger.debug('{0} health check error: {1}'.format(name, e))
+                return False
+
+        start = time.time()
+        try:
+            wait(predicate,
+                 timeout_seconds=timeout_seconds,
+                 waiting_for='{0} health check to pass'.format(name),
+                 log=False)
+            passed = None if stopped.is_set() else True
+        except HealthCheckFailed as e:
+            logger.error('{0} health check is failed: {1}'.format(name, e))
+            stopped.set()
+            passed = False
+        except TimeoutExpired:
+            passed = False
+        return HealthCheckResult(name, passed, time.time() - start)
+
+    pool = Pool(max(1, len(checks)))
+    try:
+        results = pool.map(run_check, checks.items())
+    finally:
+        pool.terminate()
+    outcomes = {True: 'passed', False: 'failed', None: 'stopped'}
+    for result in sorted(results, key=lambda x: x.latency, reverse=True):
+        logger.info('Health check {0.name}: {1} in {0.latency:.1f}s'.format(
+            result, outcomes[result.passed]))
+    return results
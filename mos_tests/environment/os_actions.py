@@ -12,15 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import logging
+from multiprocessing.dummy import Pool
 import random
 import time
+import uuid
 
 from cinderclient import client as cinderclient
 from dateutil.parser import parse as dateparse
 from glanceclient.v2.client import Client as GlanceClient
 from heatclient.v1.client import Client as HeatClient
-from keystoneclient.auth.identity.v2 import Password as KeystonePassword
 from keystoneclient import session
 from keystoneclient.v2_0 import Client as KeystoneClient
 from neutronclient.common.exceptions import Conflict as NeutronConflict
@@ -30,11 +32,16 @@ from novaclient import client as nova_client
 from novaclient import exceptions as nova_exceptions
 import paramiko
 import six
+from waiting import TimeoutExpired
 
+from mos_tests.environment.ssh import NetnsProxy
 from mos_tests.environment.ssh import SSHClient
-from mos_tests.functions.common import gen_temp_file
+from mos_tests.environment.token_cache import CachedKeystonePassword
+from mos_tests.functions.cleanup import Cleanup
+from mos_tests.functions.common import get_cert_file
 from mos_tests.functions.common import wait
 from mos_tests.functions import os_cli
+from mos_tests.functions.resource_watch import ResourceWatcher
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +56,109 @@ class InstanceError(Exception):
                 '{0.fault[details]}'.format(self.instance))
 
 
+class ServersError(Exception):
+    """Some of servers are failed
+
+    :param failures: dict {server: failure description}
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def __str__(self):
+        return '{0} instance(s) failed:\n{1}'.format(
+            len(self.failures),
+            '\n'.join('{0.name} ({0.id}): {1}'.format(server, failure)
+                      for server, failure in self.failures.items()))
+
+
+class lazy_client(object):
+    """Create attribute value on first access and store it to instance"""
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.__name__] = self.func(obj)
+        return value
+
+
+class ServersStatusTracker(object):
+    """Status of many servers, which is fetched with one API call
+
+    All servers are fetched with single `servers.list` call on each
+    `update`, so API load doesn't depend on count of watched servers.
+    Shared snapshot may contain servers of current project only, servers
+    absent in it are fetched one by one.
+
+    :param nova: nova client
+    :param servers: list of servers (or their ids) to watch
+    :param search_opts: `servers.list` search options (e.g. all_tenants),
+        shared snapshot is not used if they are set
+    """
+
+    def __init__(self, nova, servers, search_opts=None):
+        self.nova = nova
+        self.search_opts = search_opts
+        self.server_ids = [getattr(x, 'id', x) for x in servers]
+        self.ready = []
+        self.pending = list(self.server_ids)
+        # last fetched servers as {id: server}
+        self.servers = {}
+        self._deleted = set()
+
+    def _get_server(self, server_id):
+        """Returns server or None if it is deleted"""
+        if server_id in self._deleted:
+            return None
+        try:
+            server = self.nova.servers.get(server_id)
+        except nova_exceptions.NotFound:
+            server = None
+        if server is None or server.status == 'DELETED':
+            self._deleted.add(server_id)
+            return None
+        return server
+
+    def update(self, status, servers=None):
+        """Fetch servers and sort them to ready and pending
+
+        :param status: expected status or `None` to wait servers deletion
+        :param servers: already fetched servers snapshot as {id: server}
+        :raises InstanceError: if any of watched servers is in ERROR status
+        :returns: True if all servers are ready
+        """
+        is_snapshot = servers is not None and self.search_opts is None
+        if not is_snapshot:
+            servers = {x.id: x for x in self.nova.servers.list(
+                detailed=True, search_opts=self.search_opts)}
+        self.ready, self.pending = [], []
+        self.servers = {}
+        for server_id in self.server_ids:
+            server = servers.get(server_id)
+            if server is None and is_snapshot:
+                # server may belong to other project
+                server = self._get_server(server_id)
+            if server is not None:
+                self.servers[server_id] = server
+            if server is not None and server.status == 'ERROR':
+                # Get full server info for fault details
+                raise InstanceError(self.nova.servers.get(server_id))
+            if server is None and status is None:
+                self.ready.append(server_id)
+            elif server is not None and server.status == status:
+                self.ready.append(server_id)
+            else:
+                self.pending.append(server_id)
+        logger.debug('{0} of {1} servers are {2}'.format(
+            len(self.ready), len(self.server_ids), status or 'deleted'))
+        return not self.pending
+
+
 class OpenStackActions(object):
     """OpenStack base services clients and helper actions"""
 
@@ -67,36 +177,93 @@ class OpenStackActions(object):
             self.insecure = True
         else:
             auth_url = 'https://{0}:5000/v2.0/'.format(self.controller_ip)
-            with gen_temp_file(prefix="fuel_cert_", suffix=".pem") as f:
-                f.write(cert)
-            self.path_to_cert = f.name
+            self.path_to_cert = get_cert_file(cert)
             self.insecure = False
 
         logger.debug('Auth URL is {0}'.format(auth_url))
-        auth = KeystonePassword(username=user,
-                                password=password,
-                                auth_url=auth_url,
-                                tenant_name=tenant)
-
+        self.auth_url = auth_url
+        auth = CachedKeystonePassword(username=user,
+                                      password=password,
+                                      auth_url=auth_url,
+                                      tenant_name=tenant)
+
+        # Token and service catalog are fetched once by auth plugin on the
+        # first request (or taken from token cache) and are shared by all
+        # clients
         self.session = session.Session(auth=auth, verify=self.path_to_cert)
 
-        self.keystone = KeystoneClient(session=self.session)
-        self.keystone.management_url = auth_url
-
-        self.nova = nova_client.Client(version=2, session=self.session)
-
-        self.cinder = cinderclient.Client(version=2, session=self.session)
-
-        self.neutron = neutron_client.Client(session=self.session)
-
-        self.glance = GlanceClient(session=self.session)
+        self.env = env
 
+        self.watcher = ResourceWatcher({
+            'servers': lambda: self.nova.servers.list(detailed=True),
+            'volumes': lambda: self.cinder.volumes.list(),
+            'ports': lambda: self.neutron.list_ports()['ports'],
+            'agents': lambda: self.neutron.list_agents()['agents'],
+            'stacks': lambda: self.heat.stacks.list(),
+        }, updaters={
+            'servers': self._changed_servers,
+        })
+        self.watcher.add_index('servers', 'network',
+                               lambda x: getattr(x, 'networks', {}).keys())
+        self.watcher.add_index(
+            'servers', 'security_group',
+            lambda x: [y['name'] for y in getattr(x, 'security_groups', [])])
+
+    def _changed_servers(self, servers):
+        """Return servers changed and ids of servers deleted since snapshot
+
+        Changes are requested since the latest `updated` time of servers in
+        snapshot, so local clock isn't used. Nova returns deleted servers
+        too if `changes-since` is passed.
+
+        :param servers: current snapshot as {id: server}
+        :returns: tuple (changed servers, deleted ids) or None if full
+            refresh is needed
+        """
+        updated = [x.updated for x in servers.values()
+                   if getattr(x, 'updated', None)]
+        if not updated:
+            return None
+        # Nova returns timestamps in the same ISO 8601 format, so they are
+        # ordered as strings
+        changes_since = max(updated)
+        servers = self.nova.servers.list(
+            detailed=True, search_opts={'changes-since': changes_since})
+        changed = [x for x in servers if x.status != 'DELETED']
+        deleted = [x.id for x in servers if x.status == 'DELETED']
+        return changed, deleted
+
+    # Clients are created on first access
+
+    @lazy_client
+    def keystone(self):
+        keystone = KeystoneClient(session=self.session)
+        keystone.management_url = self.auth_url
+        return keystone
+
+    @lazy_client
+    def nova(self):
+        return nova_client.Client(version=2, session=self.session)
+
+    @lazy_client
+    def cinder(self):
+        return cinderclient.Client(version=2, session=self.session)
+
+    @lazy_client
+    def neutron(self):
+        return neutron_client.Client(session=self.session)
+
+    @lazy_client
+    def glance(self):
+        return GlanceClient(session=self.session)
+
+    @lazy_client
+    def heat(self):
         endpoint_url = self.session.get_endpoint(service_type='orchestration',
                                                  endpoint_type='publicURL')
-        token = self.session.get_token()
-        self.heat = HeatClient(endpoint=endpoint_url, token=token)
-
-        self.env = env
+        # Session re-authenticates on 401 (token may be taken from cache)
+        return HeatClient(endpoint=endpoint_url, session=self.session,
+                          service_type='orchestration')
 
     def _get_cirros_image(self):
         for image in self.glance.images.list():
@@ -143,18 +310,87 @@ class OpenStackActions(object):
     def is_server_active(self, server):
         return self.server_status_is(server, 'ACTIVE')
 
-    def wait_servers_active(self, servers, timeout=10 * 60):
-        wait(lambda: all(self.is_server_active(x) for x in servers),
+    def wait_servers_status(self, servers, status, timeout=10 * 60,
+                            **kwargs):
+        """Wait servers to reach status (`None` means deletion)
+
+        :raises InstanceError: if any server goes to ERROR status
+        """
+        tracker = ServersStatusTracker(self.nova, servers)
+        wait(lambda snapshot: tracker.update(status, snapshot),
+             watch=self.watcher.watch('servers'),
              timeout_seconds=timeout,
-             waiting_for='instances to become at ACTIVE status')
+             waiting_for='instances to become at {0} status'.format(status),
+             **kwargs)
+
+    def wait_servers_active(self, servers, timeout=10 * 60):
+        self.wait_servers_status(servers, 'ACTIVE', timeout=timeout)
 
     def wait_servers_ssh_ready(self, servers, timeout=10 * 60):
-        wait(lambda: all(self.is_server_ssh_ready(x) for x in servers),
+        server_ids = [getattr(x, 'id', x) for x in servers]
+        ssh_ready = set()
+
+        def predicate(snapshot):
+            # servers of other projects are absent in snapshot
+            to_check = [snapshot.get(x) or self.nova.servers.get(x)
+                        for x in server_ids if x not in ssh_ready]
+            ssh_ready.update(self.get_ssh_ready_servers(to_check))
+            return len(ssh_ready) == len(server_ids)
+
+        wait(predicate, watch=self.watcher.watch('servers'),
              timeout_seconds=timeout,
              waiting_for='instances to be ssh ready')
 
+    def wait_servers_ready(self, servers, timeout=10 * 60, ssh=True):
+        """Wait servers to be ACTIVE and ssh ready
+
+        Statuses of all servers are fetched with one API call, ssh
+        readiness is checked with one command for each network of ACTIVE
+        servers.
+
+        :param ssh: check ssh readiness too
+        :raises ServersError: if any server goes to ERROR status
+        :returns: list of ready servers
+        """
+        tracker = ServersStatusTracker(self.nova, servers)
+        ssh_ready = set()
+
+        def predicate(snapshot):
+            try:
+                tracker.update('ACTIVE', snapshot)
+            except InstanceError:
+                failures = {}
+                for server_id in tracker.server_ids:
+                    server = (snapshot.get(server_id) or
+                              tracker.servers.get(server_id))
+                    if server is not None and server.status == 'ERROR':
+                        server = self.nova.servers.get(server_id)
+                        failures[server] = server.fault['message']
+                raise ServersError(failures)
+            if not ssh:
+                return not tracker.pending
+            to_check = [tracker.servers[x] for x in tracker.ready
+                        if x not in ssh_ready]
+            ssh_ready.update(self.get_ssh_ready_servers(to_check))
+            return len(ssh_ready) == len(tracker.server_ids)
+
+        try:
+            wait(predicate, watch=self.watcher.watch('servers'),
+                 timeout_seconds=timeout,
+                 waiting_for='instances to be ready')
+        except TimeoutExpired:
+            for server_id in tracker.pending:
+                logger.error('Instance {0} is not ACTIVE'.format(server_id))
+            for server_id in set(tracker.ready) - ssh_ready:
+                logger.error('Instance {0} is not ssh ready'.format(
+                    server_id))
+            raise
+        return [tracker.servers[x] for x in tracker.server_ids]
+
     def wait_servers_deleted(self, servers, timeout=3 * 60):
-        wait(lambda: all(self.is_server_deleted(x) for x in servers),
+        tracker = ServersStatusTracker(self.nova, servers)
+        wait(lambda snapshot: tracker.update(None, snapshot),
+             watch=self.watcher.watch('servers'),
              timeout_seconds=timeout,
              waiting_for='instances to be deleted')
 
@@ -185,6 +421,52 @@ class OpenStackActions(object):
             self.wait_servers_ssh_ready([srv], timeout=timeout)
         return self.get_instance_detail(srv.id)
 
+    def create_servers(self, name, count=1, image_id=None, flavor=1,
+                       userdata=None, files=None, key_name=None, timeout=600,
+                       wait_for_active=True, wait_for_avaliable=True,
+                       **kwargs):
+        """Boot identical servers with one API request
+
+        Servers are named `<name>-<unique suffix>-<index>` (index is added
+        by Nova if count is greater than 1), so names of servers booted by
+        different calls don't collide. For servers with different
+        placements call it for each placement with `wait_for_active=False`
+        and wait all servers with `wait_servers_ready`.
+
+        :param count: count of servers
+        :raises ServersError: if any server goes to ERROR status
+        :returns: list of servers
+        """
+        if image_id is None:
+            image_id = self._get_cirros_image().id
+        prefix = '{0}-{1}'.format(name, uuid.uuid4().hex[:8])
+        self.nova.servers.create(
+            name=prefix,
+            image=image_id,
+            flavor=flavor,
+            userdata=userdata,
+            files=files,
+            key_name=key_name,
+            min_count=count,
+            max_count=count,
+            **kwargs)
+        # name is a regexp for Nova
+        servers = self.nova.servers.list(
+            search_opts={'name': '^{0}'.format(prefix)})
+        if len(servers) != count:
+            for server in servers:
+                self.nova.servers.delete(server)
+            raise AssertionError(
+                '{0} of {1} servers are found with name {2}'.format(
+                    len(servers), count, prefix))
+        logger.debug('Servers {0} are booted'.format(
+            [x.name for x in servers]))
+
+        if wait_for_active:
+            servers = self.wait_servers_ready(servers, timeout=timeout,
+                                              ssh=wait_for_avaliable)
+        return servers
+
     def is_server_ssh_ready(self, server):
         """Check ssh connect to server"""
 
@@ -194,6 +476,66 @@ class OpenStackActions(object):
                                           password='fake')
         return bool(ssh_client.check_connection())
 
+    def get_ssh_ready_servers(self, servers, timeout=3, concurrency=10):
+        """Return ids of servers, which ssh servers send banner
+
+        Banners of all servers in network are read by one command run in
+        DHCP namespace on node with DHCP agent of network, commands for
+        different networks are run simultaneously.
+
+        :param servers: servers with actual addresses
+        :param timeout: max time (in seconds) of banner reading
+        :param concurrency: max count of simultaneously checked networks
+        :rtype: set
+        """
+        # {mac: (server id, fixed ip)}
+        fixed_ips = {}
+        for server in servers:
+            for ips in getattr(server, 'addresses', {}).values():
+                for ip in ips:
+                    if ip['OS-EXT-IPS:type'] == 'fixed':
+                        fixed_ips[ip['OS-EXT-IPS-MAC:mac_addr']] = (
+                            server.id, ip['addr'])
+        if not fixed_ips:
+            return set()
+
+        # {network id: {fixed ip: server id}}
+        networks = {}
+        ports = self.neutron.list_ports(
+            mac_address=list(fixed_ips))['ports']
+        for port in ports:
+            if port['mac_address'] not in fixed_ips:
+                continue
+            server_id, ip = fixed_ips[port['mac_address']]
+            networks.setdefault(port['network_id'], {})[ip] = server_id
+
+        def probe(item):
+            net_id, ips = item
+            dhcp_nodes = self.get_node_with_dhcp_for_network(net_id)
+            if not dhcp_nodes:
+                logger.debug('No alive DHCP agents for network {0}'.format(
+                    net_id))
+                return []
+            command = (
+                "ip netns exec qdhcp-{net_id} sh -c '"
+                "for ip in {ips}; do "
+                "(timeout {timeout} nc $ip 22 </dev/null 2>/dev/null | "
+                "grep -q ^SSH- && echo $ip) & "
+                "done; wait'").format(net_id=net_id, ips=' '.join(ips),
+                                      timeout=timeout)
+            node = self.env.find_node_by_fqdn(dhcp_nodes[0])
+            with node.ssh() as remote:
+                result = remote.execute(command, verbose=False)
+            return [ips[x.strip()] for x in result['stdout']
+                    if x.strip() in ips]
+
+        pool = Pool(max(1, min(concurrency, len(networks))))
+        try:
+            ready = pool.map(probe, networks.items())
+        finally:
+            pool.terminate()
+        return set(x for ids in ready for x in ids)
+
     def is_server_deleted(self, server_id):
         try:
             instance = self.nova.servers.get(server_id)
@@ -349,6 +691,7 @@ class OpenStackActions(object):
         """
         def subnet_in_router_ports():
             routers_ports = self.neutron.list_ports(
+                network_id=net_id,
                 device_owner='network:router_interface')['ports']
             return subnet_id in str(routers_ports)
 
@@ -365,8 +708,9 @@ class OpenStackActions(object):
 
             # -- Delete IPs from subnet from instances --
             # get instances with IPs from net
-            insts_with_net = [x for x in self.nova.servers.findall()
-                              if net_name in getattr(x, 'networks', [])]
+            insts_with_net = self.watcher.lookup('servers', 'network',
+                                                 net_name,
+                                                 not_before=time.time())
             for inst in insts_with_net:
                 # get ports(ips) from instances
                 inst_ports = self.neutron.list_ports(
@@ -378,12 +722,13 @@ class OpenStackActions(object):
                 # wait till interface will be deleted from instance
                 wait(
                     lambda: net_name not in str(
-                        self.nova.servers.find(id=inst.id).networks),
+                        self.nova.servers.get(inst.id).networks),
                     timeout_seconds=60,
                     waiting_for="interface deletion from instance")
 
             # -- Delete Internal Interface from router --
             routers_ports = self.neutron.list_ports(
+                network_id=net_id,
                 device_owner='network:router_interface')['ports']
             for router_ports in routers_ports:
                 # get router id that has attached port from subnet
@@ -572,10 +917,8 @@ class OpenStackActions(object):
         logger.debug("Deleting security group '{sg.name}'".format(sg=sg))
 
         # if sec group in use -> remove it from instance
-        sg_search = {'name': sg.name}
-        srvs_with_sg = [x
-                        for x in self.nova.servers.findall()
-                        if sg_search in getattr(x, 'security_groups', [])]
+        srvs_with_sg = self.watcher.lookup('servers', 'security_group',
+                                           sg.name, not_before=time.time())
         for srv in srvs_with_sg:
             # remove sec group from instance
             logger.debug(('Removing sec group "{sg.name}" from instance '
@@ -595,7 +938,10 @@ class OpenStackActions(object):
 
     def get_port_by_fixed_ip(self, ip):
         """Returns neutron port by instance fixed ip"""
-        for port in self.neutron.list_ports()['ports']:
+        ports = self.neutron.list_ports(
+            fixed_ips='ip_address={0}'.format(ip))['ports']
+        # Check the address, filter may be ignored by old neutron
+        for port in ports:
             for ips in port['fixed_ips']:
                 if ip == ips['ip_address']:
                     return port
@@ -692,36 +1038,134 @@ class OpenStackActions(object):
                 logger.info('the port {} is not deletable'
                             .format(port['id']))
 
-    def cleanup_network(self, networks_to_skip=tuple()):
+    def cleanup_network(self, networks_to_skip=tuple(), concurrency=10):
         """Clean up the neutron networks.
 
+        Resources are deleted simultaneously in order of dependencies:
+        servers -> ports, router interfaces -> subnets -> networks,
+        floating ips -> routers, servers -> security groups.
+
         :param networks_to_skip: list of networks names that should be kept
+        :param concurrency: max count of simultaneous deletions
+        :rtype: mos_tests.functions.cleanup.CleanupReport
         """
         # net ids with the names from networks_to_skip are filtered out
         networks = [x['id'] for x in self.neutron.list_networks()['networks']
                     if x['name'] not in networks_to_skip]
 
-        self.delete_keypairs()
+        cleanup = Cleanup(
+            concurrency=concurrency,
+            retry_exceptions=(NeutronConflict, nova_exceptions.Conflict),
+            skip_exceptions=(NeutronClientException,
+                             nova_exceptions.ClientException,
+                             TimeoutExpired))
+        servers_watch = self.watcher.watch('servers')
+        deleted_servers = []
 
-        self.delete_floating_ips()
+        def delete_floating_ip(floating_ip):
+            try:
+                self.nova.floating_ips.delete(floating_ip)
+            except nova_exceptions.ClientException:
+                self.delete_floating_ip(floating_ip, use_neutron=True)
+
+        def delete_server(server):
+            self.nova.servers.delete(server)
+            deleted_servers.append(server.id)
 
-        self.delete_servers()
+        def wait_servers_deleted():
+            # server ports are released only after deletion
+            wait(lambda snapshot: not set(deleted_servers) & set(snapshot),
+                 watch=servers_watch, timeout_seconds=3 * 60,
+                 waiting_for='servers to be deleted')
 
-        self.delete_security_groups()
+        for key_pair in self.nova.keypairs.list():
+            cleanup.add('keypair:{0}'.format(key_pair.id),
+                        functools.partial(self.nova.keypairs.delete, key_pair))
+
+        fip_keys = []
+        for floating_ip in self.nova.floating_ips.list():
+            key = 'floating_ip:{0}'.format(floating_ip.id)
+            fip_keys.append(key)
+            cleanup.add(key, functools.partial(delete_floating_ip,
+                                               floating_ip))
+
+        servers = self.nova.servers.list()
+        for server in servers:
+            cleanup.add('server:{0}'.format(server.id),
+                        functools.partial(delete_server, server))
+        # all servers deletion is waited once
+        server_keys = []
+        if servers:
+            server_keys.append('servers:deleted')
+            cleanup.add('servers:deleted', wait_servers_deleted,
+                        deps=['server:{0}'.format(x.id) for x in servers])
+        server_ids = set(x.id for x in servers)
+
+        # {network id: port and router interface deletion keys}
+        network_port_keys = {x: [] for x in networks}
+        # {router id: router interface deletion keys}
+        router_interface_keys = {}
+        for port in self.neutron.list_ports()['ports']:
+            if port['network_id'] not in network_port_keys:
+                continue
+            owner = port['device_owner']
+            if owner.startswith('network:router_interface'):
+                key = 'router_interface:{0}'.format(port['id'])
+                cleanup.add(key, functools.partial(
+                    self.neutron.remove_interface_router, port['device_id'],
+                    {'port_id': port['id']}), deps=fip_keys)
+                router_interface_keys.setdefault(port['device_id'],
+                                                 []).append(key)
+            elif owner == '' or (owner.startswith('compute:') and
+                                 port['device_id'] in server_ids):
+                # ports created by tests and ports left by deleted servers
+                key = 'port:{0}'.format(port['id'])
+                cleanup.add(key, functools.partial(self.neutron.delete_port,
+                                                   port['id']),
+                            deps=server_keys)
+            else:
+                # DHCP ports are deleted with network, ports of other
+                # servers and services are kept
+                continue
+            network_port_keys[port['network_id']].append(key)
 
-        self.delete_ports(networks)
+        port_keys = [x for keys in network_port_keys.values() for x in keys]
+        for sg in self.nova.security_groups.list():
+            if sg.description == 'Default security group':
+                continue
+            cleanup.add('security_group:{0}'.format(sg.id),
+                        functools.partial(self.nova.security_groups.delete,
+                                          sg),
+                        deps=server_keys + port_keys)
 
-        self.delete_subnets(networks)
+        network_subnet_keys = {x: [] for x in networks}
+        for subnet in self.neutron.list_subnets()['subnets']:
+            if subnet['network_id'] not in network_subnet_keys:
+                continue
+            key = 'subnet:{0}'.format(subnet['id'])
+            cleanup.add(key, functools.partial(self.neutron.delete_subnet,
+                                               subnet['id']),
+                        deps=network_port_keys[subnet['network_id']])
+            network_subnet_keys[subnet['network_id']].append(key)
 
-        self.delete_routers()
+        # Did not find the better way to detect the fuel admin router
+        # Looks like it just always has fixed name router04
+        for router in self.neutron.list_routers()['routers']:
+            if router['name'] == 'router04':
+                continue
+            cleanup.add('router:{0}'.format(router['id']),
+                        functools.partial(self.neutron.delete_router,
+                                          router['id']),
+                        deps=(router_interface_keys.get(router['id'], []) +
+                              fip_keys))
 
-        # Delete nets
         for net in networks:
-            try:
-                self.neutron.delete_network(net)
-            except NeutronClientException:
-                logger.info('the net {} is not deletable'
-                            .format(net))
+            cleanup.add('network:{0}'.format(net),
+                        functools.partial(self.neutron.delete_network, net),
+                        deps=(network_subnet_keys[net] +
+                              network_port_keys[net] + server_keys))
+
+        return cleanup.run()
 
     def execute_through_host(self, ssh, vm_host, cmd, creds=()):
         logger.debug("Making intermediate transport")
@@ -769,8 +1213,14 @@ class OpenStackActions(object):
                         username='cirros',
                         password=None,
                         proxy_node=None,
-                        vm_ip=None):
-        """Returns direct ssh client to instance via proxy"""
+                        vm_ip=None,
+                        use_proxy_command=False):
+        """Returns direct ssh client to instance via proxy
+
+        By default instance is reached through in-process tunnel over pooled
+        ssh connection to node with DHCP namespace. With `use_proxy_command`
+        local `ssh` process is used as ProxyCommand instead.
+        """
         # Update vm data
         vm.get()
         instance_ips = {ip['addr']: {'type': ip['OS-EXT-IPS:type'],
@@ -809,6 +1259,11 @@ class OpenStackActions(object):
 
             for node in proxy_nodes:
                 ip = env.find_node_by_fqdn(node).data['ip']
+                if not use_proxy_command:
+                    proxy_commands.append(
+                        NetnsProxy(ip, dhcp_namespace,
+                                   private_keys=env.admin_ssh_keys))
+                    continue
                 key_paths = env.admin_ssh_keys_paths
                 proxy_command = (
                     "ssh {keys} -o 'StrictHostKeyChecking no' "
@@ -831,16 +1286,16 @@ class OpenStackActions(object):
                          proxy_commands=proxy_commands)
 
     def wait_agents_alive(self, agt_ids_to_check):
-        wait(lambda: all(agt['alive'] for agt in
-                         self.neutron.list_agents()['agents']
-                         if agt['id'] in agt_ids_to_check),
+        wait(lambda agents: all(agt['alive'] for agt in agents.values()
+                                if agt['id'] in agt_ids_to_check),
+             watch=self.watcher.watch('agents'),
              timeout_seconds=5 * 60,
              waiting_for='agents is alive')
 
     def wait_agents_down(self, agt_ids_to_check):
-        wait(lambda: all(not agt['alive'] for agt in
-                         self.neutron.list_agents()['agents']
-                         if agt['id'] in agt_ids_to_check),
+        wait(lambda agents: all(not agt['alive'] for agt in agents.values()
+                                if agt['id'] in agt_ids_to_check),
+             watch=self.watcher.watch('agents'),
              timeout_seconds=5 * 60,
              waiting_for='agents go down')
 
@@ -1012,8 +1467,8 @@ class OpenStackActions(object):
     def wait_volumes_deleted(self, volumes):
         names = ', '.join([x.name for x in volumes])
         wait(
-            lambda: not any([self.cinder.volumes.findall(id=x.id)
-                             for x in volumes]),
+            lambda snapshot: not any(x.id in snapshot for x in volumes),
+            watch=self.watcher.watch('volumes'),
             timeout_seconds=60 * 2,
             sleep_seconds=10,
             waiting_for='volumes [{names}] to be deleted'.format(names=names))
@@ -13,16 +13,25 @@
 #    under the License.
 
 import functools
+import hashlib
 import itertools
 import logging
+from multiprocessing.dummy import Pool
 import os
 import posixpath
+import re
 import select
 import stat
+import tempfile
+import threading
 import time
+import uuid
 
+from contextlib2 import ExitStack
 import paramiko
 import six
+from six.moves import queue
+from six.moves import shlex_quote
 
 
 logger = logging.getLogger(__name__)
@@ -83,8 +92,483 @@ class CommandResult(dict):
         return self._list_to_string('stderr')
 
 
+class MultiCommandResult(dict):
+    """Results of fan-out execution as {host: CommandResult}"""
+
+    def __init__(self, command, *args, **kwargs):
+        super(MultiCommandResult, self).__init__(*args, **kwargs)
+        self.command = command
+
+    @property
+    def failed(self):
+        return {host: result for host, result in self.items()
+                if not result.is_ok}
+
+    @property
+    def is_ok(self):
+        return len(self.failed) == 0
+
+    @property
+    def error_report(self):
+        lines = []
+        for host, result in sorted(self.failed.items()):
+            lines.append(u'{0}: exit_code is {1}'.format(
+                host, result['exit_code']))
+            if result['stderr']:
+                lines.append(u'  ' + result.stderr_string)
+        return u'\n'.join(lines)
+
+    def check(self):
+        """Raise CalledProcessError if command fails on any host"""
+        if not self.is_ok:
+            codes = {host: result['exit_code']
+                     for host, result in self.failed.items()}
+            raise CalledProcessError(self.command, codes, self.error_report)
+        return self
+
+
+class CommandStream(object):
+    """Output of running command, which is read as it arrives
+
+    Output is not accumulated in memory, so it suits for commands with huge
+    output (log dumps, `virsh dumpxml`, `tcpdump -r`, etc).
+    `exit_code` is available after stream was read to the end.
+    """
+
+    chunk_size = 64 * 1024
+    select_timeout = 1
+
+    def __init__(self, command, chan, files=(), timeout=60 * 60):
+        self.command = command
+        self.chan = chan
+        self.files = files
+        self.timeout = timeout
+        self.exit_code = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+    def __iter__(self):
+        return self.iter_lines()
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        self.chan.close()
+
+    def iter_chunks(self):
+        """Yield ('stdout' or 'stderr', data) tuples with raw output"""
+        chan = self.chan
+        deadline = time.time() + self.timeout
+        try:
+            while (not chan.closed or chan.recv_ready() or
+                   chan.recv_stderr_ready()):
+                select.select([chan], [], [chan], self.select_timeout)
+
+                if chan.recv_ready():
+                    yield 'stdout', chan.recv(self.chunk_size)
+                if chan.recv_stderr_ready():
+                    yield 'stderr', chan.recv_stderr(self.chunk_size)
+
+                if time.time() > deadline:
+                    raise Exception('Executing `{cmd}` is too long '
+                                    '(more than {timeout} seconds)'.format(
+                                        cmd=self.command,
+                                        timeout=self.timeout))
+            self.exit_code = chan.recv_exit_status()
+        finally:
+            self.close()
+
+    def iter_lines(self, decode=True):
+        """Yield ('stdout' or 'stderr', line) tuples
+
+        :param decode: decode lines from utf-8 or yield bytes as is
+        """
+        buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+
+        def convert(data):
+            data = bytes(data)
+            if decode:
+                data = data.decode('utf-8', 'replace')
+            return data
+
+        for name, data in self.iter_chunks():
+            buf = buffers[name]
+            buf.extend(data)
+            start = 0
+            end = buf.find(b'\n') + 1
+            while end > 0:
+                yield name, convert(buf[start:end])
+                start = end
+                end = buf.find(b'\n', start) + 1
+            del buf[:start]
+
+        for name in ('stdout', 'stderr'):
+            if buffers[name]:
+                yield name, convert(buffers[name])
+
+    def collect(self, max_memory=None):
+        """Read whole output to file-like objects
+
+        :param max_memory: size (in bytes) of each stream output, which will
+            be kept in memory; bigger output will be spilled to temporary
+            file on disk. If None - output is always kept in memory.
+        :return: tuple with stdout and stderr file-like objects, rewound to
+            the beginning
+        """
+        if max_memory is None:
+            files = {'stdout': six.BytesIO(), 'stderr': six.BytesIO()}
+        else:
+            files = {
+                'stdout': tempfile.SpooledTemporaryFile(max_size=max_memory),
+                'stderr': tempfile.SpooledTemporaryFile(max_size=max_memory)}
+        for name, data in self.iter_chunks():
+            files[name].write(data)
+        for f in files.values():
+            f.seek(0)
+        return files['stdout'], files['stderr']
+
+
+class ShellSession(object):
+    """Long-lived shell to execute commands back-to-back over one channel
+
+    Each command runs in subshell with closed stdin. It is followed by
+    unique marker in stdout (with exit code) and in stderr, so outputs are
+    kept separated and command boundaries are recovered without opening
+    new channel for each command.
+    """
+
+    chunk_size = 64 * 1024
+    select_timeout = 1
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.chan = None
+
+    @property
+    def closed(self):
+        return self.chan is None or self.chan.closed
+
+    def open(self):
+        transport = self.remote._ssh.get_transport()
+        self.chan = transport.open_session(timeout=self.remote.timeout)
+        self.chan.exec_command('bash')
+        return self
+
+    def close(self):
+        if self.chan is not None:
+            self.chan.close()
+            self.chan = None
+
+    def _make_script(self, command, marker):
+        if self.remote.sudo_mode:
+            command = "sudo -S -p '' bash -c \"{cmd}\" <<< {password}".format(
+                cmd=command.replace('"', '\\"'),
+                password=shlex_quote(self.remote.password or ''))
+        script = ('({cmd}\n) < /dev/null\n'
+                  'printf "\\n{marker} %d\\n" $?\n'
+                  'printf "\\n{marker}\\n" >&2\n')
+        return script.format(cmd=command, marker=marker)
+
+    def execute(self, command):
+        """Execute command in shell
+
+        :rtype: CommandResult
+        """
+        if self.closed:
+            raise Exception('Shell session is closed')
+        logger.debug("Executing command in shell: '%s'" % command.rstrip())
+        marker = uuid.uuid4().hex
+        self.chan.sendall(self._make_script(command, marker))
+
+        stdout_end = re.compile(b'\n' + marker.encode('ascii') +
+                                b' (\\d+)\n')
+        stderr_end = b'\n' + marker.encode('ascii') + b'\n'
+        stdout, stderr = bytearray(), bytearray()
+        exit_code = None
+        stderr_done = False
+        chan = self.chan
+        deadline = time.time() + self.remote.execution_timeout
+        while exit_code is None or not stderr_done:
+            if (chan.closed and not chan.recv_ready() and
+                    not chan.recv_stderr_ready()):
+                self.close()
+                raise Exception('Shell session was closed during executing '
+                                '`{cmd}`'.format(cmd=command))
+            select.select([chan], [], [chan], self.select_timeout)
+
+            # search markers only in new data (with marker length overlap)
+            stdout_pos = max(0, len(stdout) - len(marker) - 32)
+            stderr_pos = max(0, len(stderr) - len(marker) - 2)
+            while chan.recv_ready():
+                stdout.extend(chan.recv(self.chunk_size))
+            while chan.recv_stderr_ready():
+                stderr.extend(chan.recv_stderr(self.chunk_size))
+
+            if exit_code is None:
+                match = stdout_end.search(stdout, stdout_pos)
+                if match is not None:
+                    exit_code = int(match.group(1))
+                    del stdout[match.start():]
+            if not stderr_done:
+                pos = stderr.find(stderr_end, stderr_pos)
+                if pos != -1:
+                    stderr_done = True
+                    del stderr[pos:]
+
+            if time.time() > deadline:
+                # shell state is unknown now, so it can't be reused
+                self.close()
+                raise Exception('Executing `{cmd}` is too long '
+                                '(more than {timeout} seconds)'.format(
+                                    cmd=command,
+                                    timeout=self.remote.execution_timeout))
+
+        return CommandResult({
+            'stdout': bytes(stdout).splitlines(True),
+            'stderr': bytes(stderr).splitlines(True),
+            'exit_code': exit_code
+        })
+
+
+class PooledConnection(object):
+    """Live ssh connection owned by SSHConnectionPool"""
+
+    def __init__(self, key, ssh, proxy=None):
+        self.key = key
+        self.ssh = ssh
+        self.proxy = proxy
+        self.leases = 0
+        self.last_used = time.time()
+
+    @property
+    def transport(self):
+        return self.ssh.get_transport()
+
+    def close(self):
+        for resource in (self.ssh, self.proxy):
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception:
+                logger.exception("Could not close pooled connection")
+
+
+class SSHConnectionPool(object):
+    """Session-wide pool of live ssh transports
+
+    Connections are keyed by (host, port, username, credentials,
+    proxy_command), credentials are password hash and keys fingerprints.
+    SSHClient instances with pool lease transport from it and open own
+    channels over it instead of making new handshake for each `with` block.
+
+    :param max_idle: seconds after that unused connection will be closed
+    :param check_after: seconds of inactivity after that connection will be
+        probed with new session before leasing
+    """
+
+    def __init__(self, max_idle=5 * 60, check_after=10, keepalive=30):
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.keepalive = keepalive
+        self._connections = {}
+        self._lock = threading.RLock()
+        self._host_locks = {}
+
+    def __len__(self):
+        return len(self._connections)
+
+    @staticmethod
+    def make_key(client, proxy_command=None):
+        password = client.password
+        if password is not None:
+            password = hashlib.sha1(password.encode('utf-8')).hexdigest()
+        fingerprints = tuple(sorted(x.get_fingerprint()
+                                    for x in client.private_keys))
+        return (client.host, client.port, client.username,
+                (password, fingerprints), proxy_command)
+
+    def _get_host_lock(self, client):
+        host_key = (client.host, client.port, client.username)
+        with self._lock:
+            return self._host_locks.setdefault(host_key, threading.Lock())
+
+    def _discard(self, connection):
+        with self._lock:
+            if self._connections.get(connection.key) is connection:
+                del self._connections[connection.key]
+        connection.close()
+
+    def _is_healthy(self, connection):
+        transport = connection.transport
+        if transport is None or not transport.is_active():
+            return False
+        if time.time() - connection.last_used < self.check_after:
+            return True
+        try:
+            transport.open_session(timeout=self.check_after).close()
+        except Exception as e:
+            logger.debug('Pooled connection {0} is dead: {1}'.format(
+                connection.key, e))
+            return False
+        return True
+
+    def evict_idle(self):
+        """Close connections which were not used more than `max_idle`"""
+        deadline = time.time() - self.max_idle
+        with self._lock:
+            idle = [x for x in self._connections.values()
+                    if x.leases == 0 and x.last_used < deadline]
+        for connection in idle:
+            logger.debug('Close idle connection {0}'.format(connection.key))
+            self._discard(connection)
+
+    def _find(self, client):
+        for proxy_command in client.proxy_commands or [None]:
+            key = self.make_key(client, proxy_command)
+            with self._lock:
+                connection = self._connections.get(key)
+            if connection is None:
+                continue
+            if self._is_healthy(connection):
+                return connection
+            self._discard(connection)
+
+    def acquire(self, client):
+        """Return leased connection for client, connect if needed
+
+        :type client: SSHClient
+        :rtype: PooledConnection
+        """
+        self.evict_idle()
+        with self._get_host_lock(client):
+            connection = self._find(client)
+            if connection is None:
+                client.reconnect()
+                key = self.make_key(client, client._proxy_command)
+                connection = PooledConnection(key, client._ssh, client._proxy)
+                if self.keepalive:
+                    connection.transport.set_keepalive(self.keepalive)
+                with self._lock:
+                    self._connections[key] = connection
+            with self._lock:
+                connection.leases += 1
+                connection.last_used = time.time()
+        return connection
+
+    def release(self, connection):
+        with self._lock:
+            connection.leases -= 1
+            connection.last_used = time.time()
+
+    def evict(self, host):
+        """Close all connections to host (before its reboot, for example)"""
+        with self._lock:
+            connections = [x for x in self._connections.values()
+                           if x.key[0] == host]
+            for connection in connections:
+                del self._connections[connection.key]
+        for connection in connections:
+            logger.debug('Close connection {0}'.format(connection.key))
+            connection.close()
+
+    def clear(self):
+        """Close all connections (after snapshot revert, for example)"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        if connections:
+            logger.debug('Close {0} pooled ssh connections'.format(
+                len(connections)))
+        for connection in connections:
+            connection.close()
+
+
+ssh_pool = SSHConnectionPool()
+
+
+class NetnsTunnel(object):
+    """Relay channel opened by NetnsProxy"""
+
+    def __init__(self, remote, channel):
+        self.remote = remote
+        self.channel = channel
+
+    def close(self):
+        try:
+            self.channel.close()
+        finally:
+            self.remote.__exit__(None, None, None)
+
+
+class NetnsProxy(object):
+    """In-process replacement of `ssh node 'ip netns exec ns nc'` proxy
+
+    Relay is a `nc` process, started in network namespace over session
+    channel of (pooled) transport to the node, so connection through it
+    doesn't fork local ssh process and doesn't make extra handshake
+    with the node.
+
+    :param host: node address
+    :param namespace: network namespace name
+    :param kwargs: SSHClient arguments to connect to node
+    """
+
+    def __init__(self, host, namespace, username='root', private_keys=None,
+                 pool=ssh_pool, **kwargs):
+        self.host = host
+        self.namespace = namespace
+        self.username = username
+        self.private_keys = private_keys
+        self.pool = pool
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return 'netns {0.namespace} on {0.username}@{0.host}'.format(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, NetnsProxy):
+            return False
+        return str(self) == str(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def open(self, host, port=22, timeout=None):
+        """Open tunnel to host:port inside namespace
+
+        :rtype: NetnsTunnel
+        """
+        remote = SSHClient(self.host, username=self.username,
+                           private_keys=self.private_keys, pool=self.pool,
+                           **self.kwargs)
+        remote.__enter__()
+        try:
+            transport = remote._ssh.get_transport()
+            channel = transport.open_session(timeout=timeout)
+            channel.exec_command('ip netns exec {ns} nc {host} {port}'.format(
+                ns=self.namespace, host=host, port=port))
+        except Exception:
+            remote.__exit__(None, None, None)
+            raise
+        return NetnsTunnel(remote, channel)
+
+
 class SSHClient(object):
 
+    # Seconds to wait before trying next connect candidate in parallel
+    connect_stagger = 2
+
+    # Last successful connect candidates by (host, port, username)
+    _preferred_candidates = {}
+
     def __repr__(self):
         orig = super(SSHClient, self).__repr__()
         return '{} [{}:{}]'.format(orig, self.host, self.port)
@@ -105,9 +589,28 @@ class SSHClient(object):
         def __exit__(self, exc_type, value, traceback):
             self.ssh.sudo_mode = False
 
+    class get_shell(object):
+        """Execute commands over one persistent shell session
+
+        Example:
+
+            with remote.shell:
+                for x in range(100):
+                    remote.execute('pcs status')
+        """
+        def __init__(self, ssh):
+            self.ssh = ssh
+
+        def __enter__(self):
+            self.ssh._shell = ShellSession(self.ssh).open()
+
+        def __exit__(self, exc_type, value, traceback):
+            self.ssh._shell.close()
+            self.ssh._shell = None
+
     def __init__(self, host, port=22, username=None, password=None,
                  private_keys=None, proxy_commands=(), timeout=120,
-                 execution_timeout=60 * 60):
+                 execution_timeout=60 * 60, pool=None, stat_cache_ttl=None):
         self.host = str(host)
         self.port = int(port)
         self.username = username
@@ -118,15 +621,25 @@ class SSHClient(object):
 
         self.sudo_mode = False
         self.sudo = self.get_sudo(self)
+        self.shell = self.get_shell(self)
         self.timeout = timeout
         self.execution_timeout = execution_timeout
         self.proxy_commands = proxy_commands
+        self.pool = pool
+        self.stat_cache_ttl = stat_cache_ttl
+        self._stat_cache = {}
         self._ssh = None
         self._sftp_client = None
         self._proxy = None
+        self._proxy_command = None
+        self._connection = None
+        self._shell = None
         self.closed = True
 
     def clear(self):
+        if self._shell is not None:
+            self._shell.close()
+
         if self._sftp_client is not None:
             try:
                 self._sftp_client.close()
@@ -134,6 +647,14 @@ class SSHClient(object):
             except Exception:
                 logger.exception("Could not close sftp connection")
 
+        if self._connection is not None:
+            # Transport is owned by pool, so just return it back
+            self.pool.release(self._connection)
+            self._connection = None
+            self._ssh = None
+            self._proxy = None
+            return
+
         if self._ssh is not None:
             try:
                 self._ssh.close()
@@ -155,7 +676,12 @@ class SSHClient(object):
         if not self.closed:
             return self
         try:
-            self.reconnect()
+            if self.pool is not None:
+                self._connection = self.pool.acquire(self)
+                self._ssh = self._connection.ssh
+                self._proxy = self._connection.proxy
+            else:
+                self.reconnect()
         except Exception:
             self.clear()
             raise
@@ -168,7 +694,8 @@ class SSHClient(object):
         self.closed = True
         self.clear()
 
-    def connect(self, pkey=None, password=None, proxy_command=None):
+    def _open_connection(self, pkey=None, password=None, proxy_command=None):
+        """Return connected paramiko.SSHClient and proxy (or None)"""
         if pkey:
             logger.debug("Connecting to '{0.host}:{0.port}' "
                          "as '{0.username}' with key....".format(self))
@@ -177,21 +704,133 @@ class SSHClient(object):
                          "as '{0.username}:{1}'....".format(self, password))
 
         sock = None
-        if proxy_command is not None:
+        proxy = None
+        if isinstance(proxy_command, six.string_types):
             logger.debug('Proxy for ssh: "{0}"'.format(proxy_command))
-            self._proxy = paramiko.ProxyCommand(proxy_command)
-            self._proxy.settimeout(self.timeout)
-            sock = self._proxy
+            proxy = paramiko.ProxyCommand(proxy_command)
+            proxy.settimeout(self.timeout)
+            sock = proxy
+        elif proxy_command is not None:
+            logger.debug('Tunnel for ssh: "{0}"'.format(proxy_command))
+            proxy = proxy_command.open(self.host, self.port,
+                                       timeout=self.timeout)
+            sock = proxy.channel
+
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(self.host, port=self.port, username=self.username,
+                        password=password, pkey=pkey, banner_timeout=30,
+                        sock=sock)
+        except Exception:
+            self._close_connection(ssh, proxy)
+            raise
+        return ssh, proxy
+
+    @staticmethod
+    def _close_connection(ssh, proxy):
+        for resource in (ssh, proxy):
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception:
+                logger.exception("Could not close connection")
 
-        self._ssh = paramiko.SSHClient()
-        self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        return self._ssh.connect(self.host, port=self.port,
-                                 username=self.username, password=password,
-                                 pkey=pkey, banner_timeout=30, sock=sock)
+    def connect(self, pkey=None, password=None, proxy_command=None):
+        self._ssh, self._proxy = self._open_connection(
+            pkey=pkey, password=password, proxy_command=proxy_command)
+        self._proxy_command = proxy_command
+
+    def _get_candidates(self):
+        """Return list of connect kwargs, last successful one first"""
+        params = [{'pkey': x} for x in self.private_keys]
+        if self.password is not None:
+            params.append({'password': self.password})
+
+        proxies = self.proxy_commands or [None]
+        candidates = [dict(proxy_command=proxy_command, **param)
+                      for proxy_command, param
+                      in itertools.product(proxies, params)]
+        preferred = self._preferred_candidates.get(
+            (self.host, self.port, self.username))
+        if preferred in candidates:
+            candidates.remove(preferred)
+            candidates.insert(0, preferred)
+        return candidates
+
+    def _race_connections(self, candidates, try_all):
+        """Try to connect with candidates with staggered starts
+
+        Next candidate is started after `connect_stagger` seconds or right
+        after any previous attempt fails. First successful connection wins,
+        others are closed as soon as they finish.
+
+        :return: tuple with winner candidate and (ssh, proxy) connection or
+            None and exception to return from check_connection
+        """
+        results = queue.Queue()
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def attempt(candidate):
+            try:
+                connection = self._open_connection(**candidate)
+            except Exception as e:
+                results.put((candidate, None, e))
+                return
+            with lock:
+                if not done.is_set():
+                    results.put((candidate, connection, None))
+                    return
+            self._close_connection(*connection)
+
+        pending = list(candidates)
+        running = 0
+        winner = None
+        auth_exception = False
+        try:
+            while pending or running:
+                if pending and (running == 0 or results.empty()):
+                    thread = threading.Thread(target=attempt,
+                                              args=(pending.pop(0),))
+                    thread.daemon = True
+                    thread.start()
+                    running += 1
+                try:
+                    timeout = self.connect_stagger if pending else None
+                    candidate, connection, error = results.get(
+                        timeout=timeout)
+                except queue.Empty:
+                    continue
+                running -= 1
+                if connection is not None:
+                    winner = candidate, connection
+                    return winner
+                if isinstance(error, paramiko.AuthenticationException):
+                    logger.debug('Authentication exception: {}'.format(error))
+                    auth_exception = error
+                    if not try_all:
+                        return None, auth_exception
+                else:
+                    logger.debug('Instance unavailable: {}'.format(error))
+            return None, auth_exception
+        finally:
+            with lock:
+                done.set()
+            winner_connection = winner[1] if winner else None
+            while not results.empty():
+                _, connection, _ = results.get()
+                if connection not in (None, winner_connection):
+                    self._close_connection(*connection)
 
     def check_connection(self, close=True, try_all=False):
         """Check is ssh connection are available
 
+        Candidates (proxy and credentials combinations) are tried
+        concurrently with staggered starts, combination which succeeds is
+        tried first on next check.
+
         :rtype: bool | Exception
         :return:
             - True, if connect and authorization is ok,
@@ -199,29 +838,20 @@ class SSHClient(object):
             but authorization fail
             - False otherwise
         """
-        params = [{'pkey': x} for x in self.private_keys]
-        if self.password is not None:
-            params.append({'password': self.password})
-
-        proxies = self.proxy_commands or [None]
-        auth_exception = False
+        self.clear()
         try:
-            for proxy_command, param in itertools.product(proxies, params):
-                self.clear()
-                try:
-                    self.connect(proxy_command=proxy_command, **param)
-                    return True
-                except paramiko.AuthenticationException as e:
-                    logger.debug('Authentication exception: {}'.format(e))
-                    auth_exception = e
-                    if not try_all:
-                        return auth_exception
-                except Exception as e:
-                    logger.debug('Instance unavailable: {}'.format(e))
+            candidate, result = self._race_connections(
+                self._get_candidates(), try_all=try_all)
+            if candidate is None:
+                return result
+            self._ssh, self._proxy = result
+            self._proxy_command = candidate['proxy_command']
+            self._preferred_candidates[
+                (self.host, self.port, self.username)] = candidate
+            return True
         finally:
             if close:
                 self.clear()
-        return auth_exception
 
     @retry(count=3, delay=3)
     def reconnect(self):
@@ -262,54 +892,17 @@ class SSHClient(object):
 
     @classmethod
     def execute_together(cls, remotes, command):
-        futures = {}
-        errors = {}
-        for remote in remotes:
-            cmd = "%s\n" % command
-            if remote.sudo_mode:
-                cmd = 'sudo -S bash -c "%s"' % cmd.replace('"', '\\"')
-            chan = remote._ssh.get_transport().open_session()
-            chan.exec_command(cmd)
-            futures[remote] = chan
-        for remote, chan in futures.items():
-            ret = chan.recv_exit_status()
-            if ret != 0:
-                errors[remote.host] = ret
-        if errors:
-            raise CalledProcessError(command, errors)
+        execute_on_remotes(remotes, command, concurrency=len(remotes),
+                           verbose=False).check()
 
     def execute(self, command, verbose=True, merge_stderr=False):
-        chan, stdin, stdout, stderr = self.execute_async(
-            command, merge_stderr=merge_stderr)
-
-        stdout_buf = ''
-        stderr_buf = ''
-
-        start = time.time()
-        while not chan.closed or chan.recv_ready() or chan.recv_stderr_ready():
-            select.select([chan], [], [chan], 60)
-
-            if chan.recv_ready():
-                stdout_buf += chan.recv(1024)
-            if chan.recv_stderr_ready():
-                stderr_buf += chan.recv_stderr(1024)
-
-            if time.time() > start + self.execution_timeout:
-                chan.close()
-                raise Exception('Executing `{cmd}` is too long '
-                                '(more than {timeout} seconds)'.format(
-                                    cmd=command,
-                                    timeout=self.execution_timeout))
-
-        result = CommandResult({
-            'stdout': stdout_buf.splitlines(True),
-            'stderr': stderr_buf.splitlines(True),
-            'exit_code': chan.recv_exit_status()
-        })
-        stdin.close()
-        stdout.close()
-        stderr.close()
-        chan.close()
+        if self._shell is not None and not merge_stderr:
+            if self._shell.closed:
+                self._shell.open()
+            self._stat_cache.clear()
+            result = self._shell.execute(command)
+        else:
+            result = self._execute_in_channel(command, merge_stderr)
         if verbose:
             logger.debug("'{0}' exit_code is {1}".format(command, result[
                 'exit_code']))
@@ -319,8 +912,46 @@ class SSHClient(object):
                 logger.debug(u'Stderr:\n{0}'.format(result.stderr_string))
         return result
 
+    def _execute_keeping_stat_cache(self, command):
+        """Execute read-only command without stat cache invalidation"""
+        cache = dict(self._stat_cache)
+        result = self.execute(command, verbose=False)
+        self._stat_cache.update(cache)
+        return result
+
+    def _execute_in_channel(self, command, merge_stderr=False):
+        buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+        with self.execute_stream(command, merge_stderr=merge_stderr) as stream:
+            for name, data in stream.iter_chunks():
+                buffers[name].extend(data)
+
+        return CommandResult({
+            'stdout': bytes(buffers['stdout']).splitlines(True),
+            'stderr': bytes(buffers['stderr']).splitlines(True),
+            'exit_code': stream.exit_code
+        })
+
+    def execute_stream(self, command, merge_stderr=False):
+        """Execute command and return CommandStream to read output from
+
+        Example:
+
+            with remote.execute_stream('cat /var/log/syslog') as stream:
+                for name, line in stream:
+                    ...
+            assert stream.exit_code == 0
+
+        :rtype: CommandStream
+        """
+        chan, stdin, stdout, stderr = self.execute_async(
+            command, merge_stderr=merge_stderr)
+        return CommandStream(command, chan, (stdin, stdout, stderr),
+                             timeout=self.execution_timeout)
+
     def execute_async(self, command, merge_stderr=False):
         logger.debug("Executing command: '%s'" % command.rstrip())
+        # Command may change anything on remote filesystem
+        self._stat_cache.clear()
         chan = self._ssh.get_transport().open_session(timeout=self.timeout)
         chan.set_combine_stderr(merge_stderr)
         stdin = chan.makefile('wb')
@@ -348,72 +979,475 @@ class SSHClient(object):
         self.execute("rm -rf %s" % path)
 
     def open(self, path, mode='r'):
+        if mode.strip('rbU'):
+            self.invalidate_stat_cache(path)
         return self._sftp.open(path, mode)
 
-    def upload(self, source, target):
+    def upload(self, source, target, concurrency=4, sync=None):
+        """Upload file or directory tree to remote host
+
+        :param concurrency: count of files to be uploaded simultaneously
+        :param sync: transfer only changed files, compared by 'mtime' or
+            'checksum' (see `SFTPTransfer.upload`)
+        :rtype: TransferStats
+        """
         logger.debug("Copying '%s' -> '%s'", source, target)
 
         if self.isdir(target):
             target = posixpath.join(target, os.path.basename(source))
 
-        source = os.path.expanduser(source)
-        if not os.path.isdir(source):
-            self._sftp.put(source, target)
-            return
-
-        for rootdir, subdirs, files in os.walk(source):
-            targetdir = os.path.normpath(
-                os.path.join(
-                    target,
-                    os.path.relpath(rootdir, source))).replace("\\", "/")
-
-            self.mkdir(targetdir)
+        self.invalidate_stat_cache(target)
+        with SFTPTransfer(self, concurrency=concurrency) as transfer:
+            return transfer.upload(source, target, sync=sync)
 
-            for entry in files:
-                local_path = os.path.join(rootdir, entry)
-                remote_path = posixpath.join(targetdir, entry)
-                if self.exists(remote_path):
-                    self._sftp.unlink(remote_path)
-                self._sftp.put(local_path, remote_path)
-
-    def download(self, destination, target):
+    def download(self, destination, target, concurrency=4):
         logger.debug("Copying '%s' -> '%s' from remote to local host",
                      destination, target)
 
         if os.path.isdir(target):
             target = posixpath.join(target, os.path.basename(destination))
 
-        if not self.isdir(destination):
-            if self.exists(destination):
-                self._sftp.get(destination, target)
-            else:
-                logger.debug("Can't download %s because "
-                             "it doesn't exist", destination)
+        if self.exists(destination):
+            with SFTPTransfer(self, concurrency=concurrency) as transfer:
+                transfer.download(destination, target)
         else:
-            logger.debug("Can't download %s because it is a directory",
-                         destination)
+            logger.debug("Can't download %s because "
+                         "it doesn't exist", destination)
         return os.path.exists(target)
 
-    def exists(self, path):
+    def invalidate_stat_cache(self, path=None):
+        """Drop cached metadata of path with its subtree (or of all paths)"""
+        if path is None:
+            self._stat_cache.clear()
+            return
+        path = path.rstrip('/')
+        for key in list(self._stat_cache):
+            if key == path or key.startswith(path + '/'):
+                self._stat_cache.pop(key, None)
+
+    def _get_cached_stat(self, path):
+        """Return (True, attrs or None) from cache or (False, None)"""
+        if not self.stat_cache_ttl:
+            return False, None
+        cached = self._stat_cache.get(path.rstrip('/') or '/')
+        if cached is None or time.time() - cached[0] > self.stat_cache_ttl:
+            return False, None
+        return True, cached[1]
+
+    def _set_cached_stat(self, path, attrs):
+        if self.stat_cache_ttl:
+            self._stat_cache[path.rstrip('/') or '/'] = (time.time(), attrs)
+
+    def lstat(self, path):
+        """Return paramiko.SFTPAttributes of path or None if it is absent
+
+        Result is cached for `stat_cache_ttl` seconds if it is set.
+        """
+        found, attrs = self._get_cached_stat(path)
+        if found:
+            return attrs
         try:
-            self._sftp.lstat(path)
-            return True
+            attrs = self._sftp.lstat(path)
         except IOError:
-            return False
+            attrs = None
+        self._set_cached_stat(path, attrs)
+        return attrs
+
+    def stat_many(self, paths):
+        """Return {path: paramiko.SFTPAttributes or None} (like `lstat`)
+
+        All not cached paths are resolved with single `stat` command.
+        """
+        result = {}
+        missing = []
+        for path in paths:
+            found, result[path] = self._get_cached_stat(path)
+            if not found:
+                missing.append(path)
+        if not missing:
+            return result
+
+        output = self._execute_keeping_stat_cache(
+            "stat -c '%f %s %Y %n' -- {0}".format(
+                ' '.join(shlex_quote(x) for x in missing)))
+        for line in output['stdout']:
+            mode, size, mtime, name = line.rstrip('\n').split(' ', 3)
+            attrs = paramiko.SFTPAttributes()
+            attrs.st_mode = int(mode, 16)
+            attrs.st_size = int(size)
+            attrs.st_mtime = int(mtime)
+            result[name] = attrs
+        for path in missing:
+            self._set_cached_stat(path, result[path])
+        return result
+
+    def exists(self, path):
+        return self.lstat(path) is not None
 
     def isfile(self, path):
-        try:
-            attrs = self._sftp.lstat(path)
-            return attrs.st_mode & stat.S_IFREG != 0
-        except IOError:
-            return False
+        attrs = self.lstat(path)
+        return attrs is not None and attrs.st_mode & stat.S_IFREG != 0
 
     def isdir(self, path):
+        attrs = self.lstat(path)
+        return attrs is not None and attrs.st_mode & stat.S_IFDIR != 0
+
+
+class TransferStats(object):
+    """Files count, size and duration of SFTP transfer"""
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.files = 0
+        self.size = 0
+        self.duration = 0
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        with self._lock:
+            self.files += 1
+            self.size += size
+
+    @property
+    def speed(self):
+        """Throughput in MB/s"""
+        if not self.duration:
+            return 0
+        return self.size / 1024.0 ** 2 / self.duration
+
+    def __str__(self):
+        return ('{0.direction} {0.files} files ({1:.2f} MB) in '
+                '{0.duration:.1f}s, {0.speed:.2f} MB/s').format(
+                    self, self.size / 1024.0 ** 2)
+
+
+class SFTPTransfer(object):
+    """SFTP transfer engine for files and directory trees
+
+    Remote tree is listed once with single `find` command instead of stat
+    for each file; files are transferred simultaneously, each worker uses
+    own SFTP channel over the same transport (paramiko pipelines requests
+    within each file).
+
+    :param remote: connected SSHClient
+    :param concurrency: count of files to be transferred simultaneously
+    """
+
+    # Manifests of synced uploads, {(host, target): {relpath: entry}}
+    _manifests = {}
+
+    def __init__(self, remote, concurrency=4):
+        self.remote = remote
+        self.concurrency = concurrency
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+    @property
+    def sftp(self):
+        """SFTP client for current thread"""
+        client = getattr(self._local, 'sftp', None)
+        if client is None:
+            client = self.remote._ssh.open_sftp()
+            self._local.sftp = client
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                logger.exception("Could not close sftp connection")
+
+    @classmethod
+    def clear_manifests(cls, host=None):
+        """Forget cached manifests of synced uploads (for host or all)"""
+        if host is None:
+            cls._manifests.clear()
+            return
+        for key in list(cls._manifests):
+            if key[0] == host:
+                cls._manifests.pop(key, None)
+
+    def list_remote(self, path):
+        """Return remote tree as {relative path: (type, size, mtime)}
+
+        Type is `find -printf %y` value: 'f' for file, 'd' for directory,
+        'l' for symlink, etc.
+        """
+        result = self.remote.execute(
+            "find {0} -mindepth 1 -printf '%y %s %T@ %P\\n'".format(
+                shlex_quote(path)),
+            verbose=False)
+        tree = {}
+        if not result.is_ok:
+            return tree
+        for line in result['stdout']:
+            kind, size, mtime, name = line.rstrip('\n').split(' ', 3)
+            tree[name] = (kind, int(size), float(mtime))
+        return tree
+
+    def _transfer(self, stats, func, files):
+        def transfer_file(paths):
+            stats.add(func(*paths))
+
+        start = time.time()
+        if self.concurrency <= 1 or len(files) <= 1:
+            for paths in files:
+                transfer_file(paths)
+        else:
+            pool = Pool(min(self.concurrency, len(files)))
+            try:
+                pool.map(transfer_file, files)
+            finally:
+                pool.terminate()
+        stats.duration = time.time() - start
+        logger.info(str(stats))
+        return stats
+
+    def _put(self, local_path, remote_path):
+        self.sftp.put(local_path, remote_path)
+        return os.path.getsize(local_path)
+
+    def _get(self, remote_path, local_path):
+        self.sftp.get(remote_path, local_path)
+        return os.path.getsize(local_path)
+
+    def _sync_put(self, local_path, remote_path):
+        size = self._put(local_path, remote_path)
+        st = os.stat(local_path)
+        self.sftp.utime(remote_path, (st.st_atime, st.st_mtime))
+        return size
+
+    @staticmethod
+    def _local_entry(path, sync):
+        """Return (size, mtime, md5) of local file for manifest"""
+        st = os.stat(path)
+        checksum = None
+        if sync == 'checksum':
+            md5 = hashlib.md5()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CommandStream.chunk_size),
+                                  b''):
+                    md5.update(chunk)
+            checksum = md5.hexdigest()
+        return st.st_size, int(st.st_mtime), checksum
+
+    def _remote_manifest(self, target, remote_tree, sync):
+        """Return remote manifest {relative path: (size, mtime, md5)}
+
+        Single file target is stored with '' relative path.
+        """
+        if remote_tree is None:
+            try:
+                st = self.sftp.stat(target)
+            except IOError:
+                return {}
+            if not stat.S_ISREG(st.st_mode):
+                return {}
+            manifest = {'': (st.st_size, int(st.st_mtime), None)}
+            command = 'md5sum {0}'.format(shlex_quote(target))
+        else:
+            manifest = {name: (size, int(mtime), None)
+                        for name, (kind, size, mtime) in remote_tree.items()
+                        if kind == 'f'}
+            command = 'cd {0} && find . -type f -exec md5sum {{}} +'.format(
+                shlex_quote(target))
+        if sync != 'checksum' or not manifest:
+            return manifest
+
+        result = self.remote.execute(command, verbose=False)
+        for line in result['stdout']:
+            checksum, name = line.rstrip('\n').split('  ', 1)
+            name = posixpath.normpath(name) if remote_tree is not None else ''
+            if name in manifest:
+                manifest[name] = manifest[name][:2] + (checksum,)
+        return manifest
+
+    @staticmethod
+    def _is_changed(local_entry, remote_entry, sync):
+        if remote_entry is None:
+            return True
+        if sync == 'checksum':
+            return local_entry[2] != remote_entry[2]
+        return local_entry[:2] != remote_entry[:2]
+
+    def upload(self, source, target, sync=None):
+        """Upload file or directory tree to exact target path
+
+        With `sync` only new and changed files are transferred, like rsync
+        does. Files are compared by size and mtime ('mtime') or by md5 sum
+        ('checksum'). Manifest of uploaded files is cached per host, so
+        next upload of the same tree doesn't read remote side at all; cache
+        should be dropped with `clear_manifests` when remote side is changed
+        outside of this engine (e.g. on snapshot revert).
+
+        :param sync: None (upload everything), 'mtime' or 'checksum'
+        :rtype: TransferStats
+        """
+        if sync not in (None, 'mtime', 'checksum'):
+            raise ValueError('Unknown sync mode {0!r}'.format(sync))
+        stats = TransferStats('Uploaded to {0}'.format(self.remote.host))
+        source = os.path.expanduser(source)
+        cache_key = (self.remote.host, target)
+        cached = self._manifests.get(cache_key) if sync else None
+
+        remote_tree = None
+        dirs = []
+        files = {}
+        if not os.path.isdir(source):
+            files[''] = (source, target)
+        else:
+            if cached is None:
+                remote_tree = self.list_remote(target)
+            dirs.append(target)
+            for rootdir, subdirs, names in os.walk(source):
+                relpath = os.path.relpath(rootdir, source).replace("\\", "/")
+                for name in subdirs:
+                    name = posixpath.normpath(posixpath.join(relpath, name))
+                    if remote_tree is None or remote_tree.get(
+                            name, ('',))[0] != 'd':
+                        dirs.append(posixpath.join(target, name))
+                for name in names:
+                    name = posixpath.normpath(posixpath.join(relpath, name))
+                    files[name] = (os.path.join(source, name),
+                                   posixpath.join(target, name))
+
+        put = self._put
+        if sync:
+            put = self._sync_put
+            local_manifest = {name: self._local_entry(paths[0], sync)
+                              for name, paths in files.items()}
+            if cached is None:
+                cached = self._remote_manifest(target, remote_tree, sync)
+            files = {name: paths for name, paths in files.items()
+                     if self._is_changed(local_manifest[name],
+                                         cached.get(name), sync)}
+            if not files:
+                dirs = []
+
+        if remote_tree is not None:
+            for name in files:
+                if remote_tree.get(name, ('',))[0] == 'l':
+                    self.sftp.unlink(posixpath.join(target, name))
+        if dirs:
+            self.remote.check_call(
+                'mkdir -p {0}'.format(' '.join(shlex_quote(x) for x in dirs)),
+                verbose=False)
         try:
-            attrs = self._sftp.lstat(path)
-            return attrs.st_mode & stat.S_IFDIR != 0
-        except IOError:
-            return False
+            self._transfer(stats, put, sorted(files.values()))
+        except Exception:
+            self._manifests.pop(cache_key, None)
+            raise
+        if sync:
+            self._manifests[cache_key] = local_manifest
+        return stats
+
+    def download(self, source, target):
+        """Download file or directory tree to exact target path
+
+        :rtype: TransferStats
+        """
+        stats = TransferStats('Downloaded from {0}'.format(self.remote.host))
+        if not stat.S_ISDIR(self.sftp.stat(source).st_mode):
+            return self._transfer(stats, self._get, [(source, target)])
+
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        files = []
+        for name, (kind, _, _) in sorted(self.list_remote(source).items()):
+            local_path = os.path.join(target, *name.split('/'))
+            if kind == 'd':
+                if not os.path.isdir(local_path):
+                    os.makedirs(local_path)
+            elif kind == 'f':
+                files.append((posixpath.join(source, name), local_path))
+        return self._transfer(stats, self._get, files)
+
+
+def _execute_commands(remote, commands, timeout, verbose):
+    """Execute commands one by one until first failure"""
+    execution_timeout = remote.execution_timeout
+    if timeout is not None:
+        remote.execution_timeout = timeout
+    try:
+        with ExitStack() as stack:
+            if remote.closed:
+                stack.enter_context(remote)
+            for command in commands:
+                result = remote.execute(command, verbose=verbose)
+                if not result.is_ok:
+                    break
+            return result
+    except Exception as e:
+        logger.warning('Execution on {0} failed: {1}'.format(remote.host, e))
+        return CommandResult({
+            'stdout': [],
+            'stderr': [str(e)],
+            'exit_code': None
+        })
+    finally:
+        remote.execution_timeout = execution_timeout
+
+
+def execute_on_remotes(remotes, commands, concurrency=10, timeout=None,
+                       verbose=True):
+    """Execute command(s) on many remotes simultaneously
+
+    Closed remotes will be connected (and closed after execution), already
+    opened ones will be used as is.
+
+    :param remotes: list of SSHClient
+    :param commands: command or list of commands to execute sequentially
+        (until first failure) on each remote, or dict with them for each
+        remote host
+    :param concurrency: max count of remotes to execute simultaneously
+    :param timeout: execution timeout (in seconds) for each remote
+    :rtype: MultiCommandResult
+    :return: result of last executed command for each remote host. Hosts,
+        which fail to connect, have `None` as exit_code
+    """
+    remotes = list(remotes)
+    if isinstance(commands, dict):
+        host_commands = {host: _as_command_list(x)
+                         for host, x in commands.items()}
+        results = MultiCommandResult('\n'.join(
+            '{0}: {1}'.format(host, ' && '.join(x))
+            for host, x in sorted(host_commands.items())))
+    else:
+        commands = _as_command_list(commands)
+        host_commands = {x.host: commands for x in remotes}
+        results = MultiCommandResult(' && '.join(commands))
+    if not remotes:
+        return results
+
+    pool = Pool(min(concurrency, len(remotes)))
+    try:
+        host_results = pool.map(
+            lambda x: _execute_commands(x, host_commands[x.host], timeout,
+                                        verbose),
+            remotes)
+    finally:
+        pool.terminate()
+    for remote, result in zip(remotes, host_results):
+        results[remote.host] = result
+    return results
+
+
+def _as_command_list(commands):
+    if isinstance(commands, six.string_types):
+        return [commands]
+    return list(commands)
 
 
 def ssh(*args, **kwargs):
@@ -0,0 +1,156 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import logging
+import os
+
+from keystoneclient import access
+from keystoneclient.auth.identity.v2 import Password as KeystonePassword
+
+from mos_tests import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache(object):
+    """On-disk cache of Keystone tokens (with service catalog)
+
+    Cache is shared by all processes (xdist workers, for example) on the
+    host, access to each entry is serialized with file lock.
+
+    :param path: cache directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file_path(self, key):
+        name = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def lock(self, key):
+        """Lock cache entry for all processes"""
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path, 0o700)
+            except OSError:
+                # made by another process
+                pass
+        with open(self._file_path(key) + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """Return cached auth body or None"""
+        try:
+            with open(self._file_path(key)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def set(self, key, body):
+        path = self._file_path(key)
+        fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                     0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(body, f)
+        os.rename(path + '.tmp', path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._file_path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Drop all cached tokens"""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if not name.endswith('.lock'):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_PATH)
+
+
+class CachedKeystonePassword(KeystonePassword):
+    """Keystone v2 password auth plugin, which uses shared token cache
+
+    Token is taken from cache if it doesn't expire soon, otherwise new
+    token is issued and stored to cache. Cached token of user or project
+    which was recreated with same name is not used if ids of them were
+    resolved by this plugin before. Token rejected by service (user or
+    project was deleted) is invalidated by session and new one is issued.
+    """
+
+    cache = token_cache
+
+    def __init__(self, *args, **kwargs):
+        super(CachedKeystonePassword, self).__init__(*args, **kwargs)
+        # (user id, project id) of the last used token
+        self._resolved_ids = None
+
+    @property
+    def _cache_key(self):
+        password = hashlib.sha1(
+            (self.password or '').encode('utf-8')).hexdigest()
+        return [self.auth_url, self.username, self.user_id, password,
+                self.tenant_id, self.tenant_name]
+
+    def _is_usable(self, auth_ref):
+        if auth_ref.will_expire_soon(self.MIN_TOKEN_LIFE_SECONDS):
+            return False
+        ids = (auth_ref.user_id, auth_ref.project_id)
+        return self._resolved_ids is None or self._resolved_ids == ids
+
+    def get_auth_ref(self, session, **kwargs):
+        key = self._cache_key
+        with self.cache.lock(key):
+            body = self.cache.get(key)
+            if body is not None:
+                auth_ref = access.AccessInfo.factory(body=body)
+                if self._is_usable(auth_ref):
+                    logger.debug('Use cached token for {0}'.format(
+                        self.username))
+                    self._resolved_ids = (auth_ref.user_id,
+                                          auth_ref.project_id)
+                    return auth_ref
+            auth_ref = super(CachedKeystonePassword, self).get_auth_ref(
+                session, **kwargs)
+            self._resolved_ids = (auth_ref.user_id, auth_ref.project_id)
+            self.cache.set(key, {'access': dict(auth_ref)})
+            return auth_ref
+
+    def invalidate(self):
+        # Token was rejected, so it shouldn't be used by other processes too
+        if self.auth_ref is not None:
+            key = self._cache_key
+            with self.cache.lock(key):
+                body = self.cache.get(key)
+                if (body is not None and body['access']['token']['id'] ==
+                        self.auth_ref.auth_token):
+                    self.cache.delete(key)
+        return super(CachedKeystonePassword, self).invalidate()
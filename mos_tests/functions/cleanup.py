@@ -0,0 +1,175 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+from multiprocessing.dummy import Pool
+import threading
+import time
+
+import six
+from six.moves import queue
+
+logger = logging.getLogger(__name__)
+
+
+class CleanupTask(object):
+    """Deletion of single resource
+
+    :param key: unique task key, like 'port:<id>'
+    :param func: function to delete resource
+    :param deps: keys of tasks, which should be finished before this one
+    """
+
+    def __init__(self, key, func, deps=()):
+        self.key = key
+        self.func = func
+        self.deps = set(deps)
+        self.outcome = None
+        self.attempts = 0
+        self.duration = 0
+        self.error = None
+
+
+class CleanupReport(object):
+    """Outcome and timing of cleanup tasks"""
+
+    def __init__(self, tasks, duration):
+        self.tasks = tasks
+        self.duration = duration
+
+    def by_outcome(self, outcome):
+        return [x for x in self.tasks if x.outcome == outcome]
+
+    def __str__(self):
+        lines = ['Cleanup of {0} resources took {1:.1f}s: {2} deleted, '
+                 '{3} not deletable, {4} errors'.format(
+                     len(self.tasks), self.duration,
+                     len(self.by_outcome('ok')),
+                     len(self.by_outcome('failed')),
+                     len(self.by_outcome('error')))]
+        for task in sorted(self.tasks, key=lambda x: x.duration,
+                           reverse=True)[:10]:
+            lines.append('  {0.duration:6.1f}s {0.outcome:6} '
+                         '{0.attempts} attempt(s) {0.key}'.format(task))
+        return '\n'.join(lines)
+
+
+class Cleanup(object):
+    """Resources deletion in order of dependencies
+
+    Tasks are executed simultaneously as soon as all their dependencies are
+    finished (successfully or not). Task raised one of `retry_exceptions`
+    is retried, raised one of `skip_exceptions` is marked as not deletable,
+    other exceptions are re-raised after all tasks are finished.
+
+    Example:
+
+        cleanup = Cleanup(retry_exceptions=(NeutronConflict,))
+        cleanup.add('subnet:1', lambda: neutron.delete_subnet(1))
+        cleanup.add('net:1', lambda: neutron.delete_network(1),
+                    deps=['subnet:1'])
+        report = cleanup.run()
+
+    :param concurrency: max count of simultaneously executed tasks
+    :param retries: max count of attempts for each task
+    :param retry_delay: delay (in seconds) before first retry, it is
+        doubled for each next retry
+    """
+
+    def __init__(self, concurrency=10, retries=5, retry_delay=2,
+                 retry_exceptions=(), skip_exceptions=()):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.skip_exceptions = tuple(skip_exceptions)
+        self.tasks = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, func, deps=()):
+        """Add task; dependencies may be added later"""
+        with self._lock:
+            self.tasks[key] = CleanupTask(key, func, deps)
+
+    def _execute(self, task):
+        start = time.time()
+        delay = self.retry_delay
+        while True:
+            task.attempts += 1
+            try:
+                task.func()
+                task.outcome = 'ok'
+                break
+            except self.retry_exceptions as e:
+                if task.attempts >= self.retries:
+                    task.outcome, task.error = 'failed', e
+                    break
+                logger.debug('Retry {0} in {1}s: {2}'.format(task.key, delay,
+                                                             e))
+                time.sleep(delay)
+                delay *= 2
+            except self.skip_exceptions as e:
+                task.outcome, task.error = 'failed', e
+                break
+            except Exception as e:
+                task.outcome, task.error = 'error', e
+                break
+        if task.outcome == 'failed':
+            logger.info('{0} is not deletable: {1}'.format(task.key,
+                                                           task.error))
+        elif task.outcome == 'error':
+            logger.error('{0} deletion failed: {1!r}'.format(task.key,
+                                                             task.error))
+        task.duration = time.time() - start
+        return task
+
+    def run(self):
+        """Execute all tasks
+
+        :rtype: CleanupReport
+        """
+        start = time.time()
+        tasks = dict(self.tasks)
+        for task in tasks.values():
+            # ignore dependencies to absent tasks
+            task.deps &= set(tasks)
+        pending = set(tasks)
+        finished = set()
+        results = queue.Queue()
+        running = 0
+        pool = Pool(max(1, min(self.concurrency, len(tasks))))
+        try:
+            while pending or running:
+                ready = [key for key in pending
+                         if tasks[key].deps <= finished]
+                if not ready and not running:
+                    # dependency cycle, run remaining tasks anyway
+                    ready = list(pending)
+                for key in sorted(ready):
+                    pending.discard(key)
+                    running += 1
+                    pool.apply_async(self._execute, (tasks[key],),
+                                     callback=results.put)
+                task = results.get()
+                running -= 1
+                finished.add(task.key)
+        finally:
+            pool.terminate()
+
+        report = CleanupReport(list(tasks.values()), time.time() - start)
+        logger.info(str(report))
+        errors = report.by_outcome('error')
+        if errors:
+            six.reraise(type(errors[0].error), errors[0].error)
+        return report
@@ -12,10 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import inspect
+import hashlib
 import logging
 import os
+import random
 import socket
+import sys
 from tempfile import NamedTemporaryFile
 from time import sleep
 from time import time
@@ -26,6 +28,8 @@ from waiting import TimeoutExpired
 from waiting import wait as base_wait
 import yaml
 
+from mos_tests.functions.wait_profile import registry as wait_registry
+
 
 logger = logging.getLogger(__name__)
 
@@ -63,14 +67,12 @@ def check_stack_status(stack_name, heat, status, timeout=60):
         False otherwise
     """
     if is_stack_exists(stack_name, heat):
-        start_time = time()
-        stack_status = [s.stack_status for s in heat.stacks.list()
-                        if s.stack_name == stack_name][0]
-        while 'IN_PROGRESS' in stack_status \
-                and time() < start_time + 60 * timeout:
-            sleep(1)
-            stack_status = [s.stack_status for s in heat.stacks.list()
-                            if s.stack_name == stack_name][0]
+        stack_status = poll_value(
+            lambda: [s.stack_status for s in heat.stacks.list()
+                     if s.stack_name == stack_name][0],
+            lambda x: 'IN_PROGRESS' not in x,
+            timeout_seconds=60 * timeout,
+            waiting_for='stack {0} to finish action'.format(stack_name))
         return stack_status == status
     return False
 
@@ -103,7 +105,7 @@ def create_stack(heat_client, stack_name, template, parameters={}, timeout=20,
         elif stack.stack_status == 'CREATE_COMPLETE':
             return True
 
-    wait(is_stack_created, timeout_seconds=timeout * 60, sleep_seconds=10,
+    wait(is_stack_created, timeout_seconds=timeout * 60,
          waiting_for='stack {} status to be '
                      'CREATE_COMPLETE'.format(stack_name))
     return uid
@@ -116,8 +118,8 @@ def delete_stack(heat_client, uid):
     """
     if uid in [s.id for s in heat_client.stacks.list()]:
         heat_client.stacks.delete(uid)
-        while uid in [s.id for s in heat_client.stacks.list()]:
-            sleep(1)
+        wait(lambda: uid not in [s.id for s in heat_client.stacks.list()],
+             waiting_for='stack {0} to be deleted'.format(uid))
 
 
 def check_stack_status_complete(heat_client, uid, action, timeout=10):
@@ -129,14 +131,11 @@ def check_stack_status_complete(heat_client, uid, action, timeout=10):
         :param timeout: Timeout for check operation
         :return uid: UID of created stack
     """
-    stack = heat_client.stacks.get(stack_id=uid).to_dict()
-    end_time = time() + 60 * timeout
-    while stack['stack_status'] == '{}_IN_PROGRESS'.format(action):
-        stack = heat_client.stacks.get(stack_id=uid).to_dict()
-        if time() > end_time:
-            break
-        else:
-            sleep(1)
+    stack = poll_value(
+        lambda: heat_client.stacks.get(stack_id=uid).to_dict(),
+        lambda x: x['stack_status'] != '{}_IN_PROGRESS'.format(action),
+        timeout_seconds=60 * timeout,
+        waiting_for='stack {0} to finish {1}'.format(uid, action))
     if stack['stack_status'] != '{}_COMPLETE'.format(action):
         raise Exception("ERROR: Stack {} is not in '{}_COMPLETE' "
                         "state:\n".format(stack, action))
@@ -318,13 +317,12 @@ def check_inst_status(nova_client, uid, status, timeout=5):
         :return True or False
     """
     if is_instance_exists(nova_client, uid):
-        start_time = time()
-        inst_status = [s.status for s in nova_client.servers.list()
-                       if s.id == uid][0]
-        while inst_status != status and time() < start_time + 60 * timeout:
-            sleep(1)
-            inst_status = [s.status for s in nova_client.servers.list()
-                           if s.id == uid][0]
+        inst_status = poll_value(
+            lambda: [s.status for s in nova_client.servers.list()
+                     if s.id == uid][0],
+            lambda x: x == status,
+            timeout_seconds=60 * timeout,
+            waiting_for='instance {0} to be {1}'.format(uid, status))
         return inst_status == status
     return False
 
@@ -342,7 +340,7 @@ def delete_instance(nova_client, uid, force=False, timeout=1):
         if is_instance_exists(nova_client, uid):
             nova_client.servers.delete(uid)
     wait(lambda: not is_instance_exists(nova_client, uid),
-         timeout_seconds=timeout * 60, sleep_seconds=10,
+         timeout_seconds=timeout * 60,
          waiting_for='instance {0} to be deleted'.format(uid))
 
 
@@ -362,7 +360,6 @@ def create_instance(nova_client, inst_name, flavor_id, net_id,
         :param inst_list: instances list for cleaning
         :return instance
     """
-    end_time = time() + 60 * timeout
     inst = nova_client.servers.create(
         name=inst_name,
         nics=[{"net-id": net_id}],
@@ -373,16 +370,15 @@ def create_instance(nova_client, inst_name, flavor_id, net_id,
         key_name=key_name)
     if inst_list:
         inst_list.append(inst.id)
-    inst_status = [s.status for s in nova_client.servers.list()
-                   if s.id == inst.id][0]
-    while inst_status != 'ACTIVE':
-        if time() > end_time:
-            raise AssertionError(
-                "Instance status is '{}' instead of 'ACTIVE'".format(
-                    inst_status))
-        sleep(1)
-        inst_status = [s.status for s in nova_client.servers.list()
-                       if s.id == inst.id][0]
+    inst_status = poll_value(
+        lambda: [s.status for s in nova_client.servers.list()
+                 if s.id == inst.id][0],
+        lambda x: x == 'ACTIVE',
+        timeout_seconds=60 * timeout,
+        waiting_for='instance {0} to be ACTIVE'.format(inst_name))
+    if inst_status != 'ACTIVE':
+        raise AssertionError(
+            "Instance status is '{}' instead of 'ACTIVE'".format(inst_status))
     return inst
 
 
@@ -394,8 +390,8 @@ def delete_floating_ip(nova_client, floating_ip):
     """
     if floating_ip in nova_client.floating_ips.list():
         nova_client.floating_ips.delete(floating_ip)
-        while floating_ip in nova_client.floating_ips.list():
-            sleep(1)
+        wait(lambda: floating_ip not in nova_client.floating_ips.list(),
+             waiting_for='floating ip {0} to be deleted'.format(floating_ip))
 
 
 def check_ip(nova_client, uid, fip, timeout=1):
@@ -407,13 +403,12 @@ def check_ip(nova_client, uid, fip, timeout=1):
         :return True or False
     """
     if is_instance_exists(nova_client, uid):
-        start_time = time()
-        ips = [ip['addr']
-               for ip in nova_client.servers.ips(uid)['admin_internal_net']]
-        while fip not in ips and time() < start_time + 60 * timeout:
-            sleep(1)
-            ips = [ip['addr'] for ip in nova_client.servers.ips(uid)[
-                'admin_internal_net']]
+        ips = poll_value(
+            lambda: [ip['addr'] for ip in nova_client.servers.ips(uid)[
+                'admin_internal_net']],
+            lambda x: fip in x,
+            timeout_seconds=60 * timeout,
+            waiting_for='floating ip {0} on instance {1}'.format(fip, uid))
         return fip in ips
     return False
 
@@ -457,14 +452,13 @@ def check_volume_status(cinder_client, uid, status, timeout=5):
         :return True or False
     """
     if is_volume_exists(cinder_client, uid):
-        start_time = time()
-        inst_status = [s.status for s in cinder_client.volumes.list()
-                       if s.id == uid][0]
-        while inst_status != status and time() < start_time + 60 * timeout:
-            sleep(1)
-            inst_status = [s.status for s in cinder_client.volumes.list()
-                           if s.id == uid][0]
-        return inst_status == status
+        volume_status = poll_value(
+            lambda: [s.status for s in cinder_client.volumes.list()
+                     if s.id == uid][0],
+            lambda x: x == status,
+            timeout_seconds=60 * timeout,
+            waiting_for='volume {0} to be {1}'.format(uid, status))
+        return volume_status == status
     return False
 
 
@@ -500,8 +494,8 @@ def delete_flavor(nova_client, flavor_id):
         if flavor.id == flavor_id:
             nova_client.flavors.delete(flavor)
             break
-    while is_flavor_exists(nova_client, flavor_id):
-        sleep(1)
+    wait(lambda: not is_flavor_exists(nova_client, flavor_id),
+         waiting_for='flavor {0} to be deleted'.format(flavor_id))
 
 
 # Images
@@ -523,8 +517,8 @@ def delete_image(glance_client, image_id):
         :return: Nothing
     """
     glance_client.images.delete(image_id)
-    while is_image_exists(glance_client, image_id):
-        sleep(1)
+    wait(lambda: not is_image_exists(glance_client, image_id),
+         waiting_for='image {0} to be deleted'.format(image_id))
 
 
 # execution of system commands
@@ -561,14 +555,14 @@ def check_volume_snapshot_status(cinder_client, uid, status, timeout=5):
             :return True or False
     """
     if check_volume_snapshot(cinder_client, uid):
-        start_time = time()
-        while time() < start_time + 60 * timeout:
-            sleep(1)
-            snapshot_status = [s.status
-                               for s in cinder_client.volume_snapshots.list()
-                               if s.id == uid.id][0]
-            if snapshot_status == status:
-                return True
+        snapshot_status = poll_value(
+            lambda: [s.status for s in cinder_client.volume_snapshots.list()
+                     if s.id == uid.id][0],
+            lambda x: x == status,
+            timeout_seconds=60 * timeout,
+            waiting_for='volume snapshot {0} to be {1}'.format(uid.id,
+                                                               status))
+        return snapshot_status == status
     return False
 
 
@@ -579,8 +573,9 @@ def delete_volume_snapshot(cinder_client, snapshot):
     """
     if snapshot in cinder_client.volume_snapshots.list():
         cinder_client.volume_snapshots.delete(snapshot)
-        while snapshot in cinder_client.volume_snapshots.list():
-            sleep(1)
+        wait(lambda: snapshot not in cinder_client.volume_snapshots.list(),
+             waiting_for='volume snapshot {0} to be deleted'.format(
+                 snapshot.id))
 
 
 # Keys
@@ -603,15 +598,51 @@ def delete_keys(nova_client, key_name):
         if key.name == key_name:
             nova_client.keypairs.delete(key)
             break
-    while is_key_exists(nova_client, key_name):
-        sleep(1)
+    wait(lambda: not is_key_exists(nova_client, key_name),
+         waiting_for='keypair {0} to be deleted'.format(key_name))
+
+
+def adaptive_sleeps(deadline=None, start=0.5, factor=1.5, max_sleep=30,
+                    jitter=0.2):
+    """Generate polling intervals for `wait`
 
+    Polling is fast at start, then interval grows exponentially with random
+    jitter (to not poll APIs synchronously from many waiters). Interval is
+    capped with `max_sleep` and 1/5 of remaining time, so the deadline is
+    not overslept.
 
-def wait(predicate, log=True, **kwargs):
+    :param deadline: time (as returned by `time()`) of waiting timeout
+    """
+    interval = start
+    while True:
+        sleep_time = min(interval * random.uniform(1 - jitter, 1 + jitter),
+                         max_sleep)
+        if deadline is not None:
+            remaining = max(0, deadline - time())
+            sleep_time = min(sleep_time, max(start, remaining / 5), remaining)
+        yield sleep_time
+        interval *= factor
+
+
+def wait(predicate, log=True, watch=None, stack_depth=1, **kwargs):
+    """Wait for predicate returns True
+
+    Without `sleep_seconds` predicate is polled with adaptive intervals
+    (see `adaptive_sleeps`), `sleep_seconds` sets fixed interval (or
+    `waiting` backoff tuple). Each wait is recorded to
+    `mos_tests.functions.wait_profile.registry`.
+
+    :param watch: ResourceWatch (see `mos_tests.functions.resource_watch`);
+        if it is passed, predicate is called with shared snapshot of
+        resources, taken after waiting start
+    :param stack_depth: depth of frame to report as wait caller
+    """
     __tracebackhide__ = True
 
-    frame = inspect.stack()[1]
-    called_from = '{0.f_globals[__name__]}:{2}'.format(*frame)
+    frame = sys._getframe(stack_depth)
+    called_from = '{0}:{1}'.format(frame.f_globals.get('__name__'),
+                                   frame.f_lineno)
+    del frame
     event = kwargs.get('waiting_for', repr(predicate))
     msg = '{called_from}: waiting for {event}'.format(event=event,
                                                       called_from=called_from)
@@ -622,16 +653,75 @@ def wait(predicate, log=True, **kwargs):
 
     start = time()
 
+    if watch is not None:
+        kwargs.setdefault('sleep_seconds', watch.interval)
+        watched_predicate = predicate
+
+        def predicate():
+            return watched_predicate(watch.snapshot(not_before=start))
+
+    if 'sleep_seconds' not in kwargs:
+        deadline = None
+        if kwargs.get('timeout_seconds') is not None:
+            deadline = start + kwargs['timeout_seconds']
+        sleeps = adaptive_sleeps(deadline)
+        first_call = [True]
+        polled_predicate = predicate
+        kwargs['sleep_seconds'] = 0
+
+        def predicate():
+            # `waiting` checks timeout right after predicate call, so sleep
+            # is done here (before the call) to not oversleep the deadline
+            if first_call[0]:
+                first_call[0] = False
+            else:
+                sleep(next(sleeps))
+            return polled_predicate()
+
+    polls = [0]
+    counted_predicate = predicate
+
+    def predicate():
+        polls[0] += 1
+        return counted_predicate()
+
+    outcome = 'error'
     try:
         result = base_wait(predicate, **kwargs)
+        outcome = 'ok'
         if log:
             logger.info('{msg} ... done. '
                         'Took {time:.0f}s'.format(msg=msg,
                                                   time=time() - start))
         return result
     except TimeoutExpired as e:
+        outcome = 'timeout'
         # prevent shows traceback from waiting package
         raise e
+    finally:
+        wait_registry.add(called_from, event, time() - start, polls[0],
+                          outcome)
+
+
+def poll_value(get_value, is_ready, timeout_seconds, waiting_for):
+    """Wait for value is ready and return last got value (even on timeout)
+
+    :param get_value: function to get value
+    :param is_ready: function(value) returns True if value is ready
+    """
+    last = []
+
+    def predicate():
+        del last[:]
+        last.append(get_value())
+        return is_ready(last[0])
+
+    try:
+        wait(predicate, timeout_seconds=timeout_seconds,
+             waiting_for=waiting_for, stack_depth=2)
+    except TimeoutExpired:
+        pass
+    return last[0]
 
 
 def gen_random_resource_name(prefix=None, reduce_by=None):
@@ -647,6 +737,23 @@ def gen_temp_file(prefix='tmp', suffix=''):
                               delete=False)
 
 
+def get_cert_file(cert):
+    """Return path to file with certificate
+
+    File is named by certificate hash, so it is written only once.
+    """
+    if not isinstance(cert, bytes):
+        cert = cert.encode('utf-8')
+    tempdir = os.path.join(os.path.dirname(__file__), '../../temp')
+    path = os.path.join(tempdir, 'fuel_cert_{0}.pem'.format(
+        hashlib.sha1(cert).hexdigest()))
+    if not os.path.exists(path):
+        with gen_temp_file(prefix="fuel_cert_", suffix=".pem") as f:
+            f.write(cert)
+        os.rename(f.name, path)
+    return os.path.abspath(path)
+
+
 def get_os_conn(environment):
     return environment.os_conn
 
@@ -686,11 +793,8 @@ def disable_ovs_agents_on_controller(env):
 def restart_ovs_agents_on_computes(env):
     """Restart openvswitch-agents on all computes."""
     computes = env.get_nodes_by_role('compute')
-
-    for node in computes:
-        with node.ssh() as remote:
-            remote.check_call(
-                'service {} restart'.format(ovs_agent_service))
+    env.execute_on_nodes(
+        computes, 'service {} restart'.format(ovs_agent_service)).check()
 
 
 def enable_ovs_agents_on_controllers(env):
@@ -0,0 +1,140 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+from six.moves import shlex_quote
+
+from mos_tests.environment.ssh import execute_on_remotes
+from mos_tests.environment.ssh import MultiCommandResult
+
+logger = logging.getLogger(__name__)
+
+
+class LogCursor(object):
+    """Position in log file on several nodes
+
+    Cursor remembers log size (byte offset) on each node, so only data
+    written after it is read later. Reading and filtering are done on nodes
+    with `tail -c`/`grep`, only matched lines are transferred. All nodes
+    are processed simultaneously.
+
+    If log becomes smaller than remembered offset (it was rotated), it is
+    read from the beginning.
+
+    Example:
+
+        cursor = LogCursor(controllers, '/var/log/neutron/server.log')
+        # do something
+        assert not any(cursor.grep('ERROR').values())
+
+    :param nodes: list of NodeProxy
+    :param path: path to log file on nodes
+    :param concurrency: max count of nodes to process simultaneously
+    """
+
+    def __init__(self, nodes, path, concurrency=10):
+        self.nodes = list(nodes)
+        self.path = path
+        self.concurrency = concurrency
+        self.offsets = {}
+        self.mark()
+
+    def __repr__(self):
+        return '<LogCursor {0} {1}>'.format(self.path, self.offsets)
+
+    def _execute(self, make_command, ok_codes=(0,)):
+        """Execute command made for each node offset
+
+        :param make_command: function(offset) returns command
+        :return: {node ip: CommandResult}
+        """
+        commands = {node.data['ip']: make_command(self.offsets.get(
+            node.data['ip'], 0)) for node in self.nodes}
+        results = execute_on_remotes([x.ssh() for x in self.nodes],
+                                     commands, concurrency=self.concurrency,
+                                     verbose=False)
+        MultiCommandResult(results.command, {
+            host: result for host, result in results.items()
+            if result['exit_code'] not in ok_codes}).check()
+        return results
+
+    def _new_data_command(self, offset, data_filter=None):
+        """Return command prints log data after offset to stdout
+
+        Current log size (to move cursor to) is printed on the first line
+        of stdout before the data.
+
+        :param data_filter: command to filter data with
+        """
+        command = (
+            'size=$(stat -c %s {path} 2>/dev/null || echo 0); '
+            'offset={offset}; '
+            '[ "$size" -lt "$offset" ] && offset=0; '
+            'echo $size; '
+            'tail -c +$((offset + 1)) {path} 2>/dev/null | '
+            'head -c $((size - offset))').format(path=shlex_quote(self.path),
+                                                 offset=offset)
+        if data_filter is not None:
+            command = '{0} | {1}'.format(command, data_filter)
+        return command
+
+    def _collect(self, results, move):
+        """Return data lines of results as {node ip: [lines]}
+
+        :param move: move cursor to log sizes printed with data
+        """
+        data = {}
+        for host, result in results.items():
+            size, lines = result['stdout'][0], result['stdout'][1:]
+            if move:
+                self.offsets[host] = int(size)
+            data[host] = lines
+        return data
+
+    def mark(self):
+        """Move cursor to the current end of log on each node"""
+        results = self._execute(
+            lambda offset: 'stat -c %s {0} 2>/dev/null || echo 0'.format(
+                shlex_quote(self.path)))
+        for host, result in results.items():
+            self.offsets[host] = int(result.stdout_string or 0)
+        logger.debug('Log offsets for {0}: {1}'.format(self.path,
+                                                       self.offsets))
+
+    def read(self, move=False):
+        """Return lines written after cursor as {node ip: [lines]}
+
+        :param move: move cursor to the end of read data
+        """
+        results = self._execute(self._new_data_command)
+        return self._collect(results, move)
+
+    def grep(self, pattern, regexp=False, max_count=None, move=False):
+        """Return lines written after cursor, which match the pattern
+
+        :param pattern: fixed string (or extended regexp if `regexp`)
+        :param max_count: max count of matched lines for each node
+        :param move: move cursor to the end of checked data
+        :return: {node ip: [matched lines]}
+        """
+        grep = 'grep {0} {1} -e {2}'.format(
+            '-E' if regexp else '-F',
+            '-m {0}'.format(max_count) if max_count else '',
+            shlex_quote(pattern))
+        # grep exits with 1 if nothing is found
+        results = self._execute(
+            lambda offset: self._new_data_command(offset, grep),
+            ok_codes=(0, 1))
+        return self._collect(results, move)
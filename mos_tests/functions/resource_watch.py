@@ -0,0 +1,170 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _resource_id(resource):
+    if isinstance(resource, dict):
+        return resource['id']
+    return resource.id
+
+
+class ResourceWatcher(object):
+    """Shared snapshots of resource lists
+
+    Each resource type is listed not more often than once per `interval`,
+    all waiters evaluate their predicates against the same snapshot.
+
+    Example:
+
+        watch = os_conn.watcher.watch('servers')
+        wait(lambda servers: servers[server.id].status == 'ACTIVE',
+             watch=watch, timeout_seconds=60)
+
+    Snapshot may be refreshed incrementally if updater is set for resource
+    type. Updater is called with current snapshot and returns tuple of
+    resources changed since it and ids of resources deleted since it (or
+    None if full refresh is needed).
+
+    Snapshots may be indexed to find resources by attributes without
+    scanning:
+
+        os_conn.watcher.add_index('servers', 'network',
+                                  lambda x: x.networks.keys())
+        servers = os_conn.watcher.lookup('servers', 'network', 'net01')
+
+    :param listers: dict with functions returns list of resources for each
+        resource type
+    :param interval: max age of snapshot (in seconds)
+    :param updaters: dict with functions returns changed and deleted
+        resources for resource types
+    """
+
+    def __init__(self, listers, interval=5, updaters=None):
+        self.listers = dict(listers)
+        self.updaters = dict(updaters or {})
+        self.interval = interval
+        self._snapshots = {}
+        self._locks = {name: threading.Lock() for name in self.listers}
+        self._index_keys = {}
+        self._indexes = {}
+
+    def register(self, name, lister, updater=None):
+        """Add new resource type"""
+        self.listers[name] = lister
+        if updater is not None:
+            self.updaters[name] = updater
+        self._locks[name] = threading.Lock()
+
+    def snapshot(self, name, not_before=None):
+        """Return resources of type as {id: resource}
+
+        :param not_before: timestamp, snapshot taken before it is refreshed
+            even if it isn't expired
+        """
+        with self._locks[name]:
+            taken_at, resources = self._snapshots.get(name, (0, None))
+            now = time.time()
+            if (resources is None or now - taken_at >= self.interval or
+                    (not_before is not None and taken_at < not_before)):
+                changes = None
+                if resources is not None and name in self.updaters:
+                    changes = self.updaters[name](resources)
+                if changes is not None:
+                    logger.debug('Update {0} snapshot'.format(name))
+                    resources = self._update(resources, *changes)
+                else:
+                    logger.debug('Refresh {0} snapshot'.format(name))
+                    resources = {_resource_id(x): x
+                                 for x in self.listers[name]()}
+                self._snapshots[name] = (now, resources)
+            return resources
+
+    def _update(self, resources, changed, deleted):
+        # snapshot may be used by waiters, so it is not changed in place
+        resources = dict(resources)
+        for resource_id in deleted:
+            resources.pop(resource_id, None)
+        resources.update((_resource_id(x), x) for x in changed)
+        return resources
+
+    def add_index(self, name, index, key):
+        """Add index of resource type snapshots
+
+        :param name: resource type
+        :param index: index name
+        :param key: function returns list of index values for resource
+        """
+        self._index_keys[(name, index)] = key
+        self._indexes.pop((name, index), None)
+
+    def lookup(self, name, index, value, not_before=None):
+        """Return list of resources with value in index
+
+        Index is rebuilt only when snapshot is refreshed.
+        """
+        resources = self.snapshot(name, not_before=not_before)
+        indexed_resources, mapping = self._indexes.get((name, index),
+                                                       (None, None))
+        if indexed_resources is not resources:
+            key = self._index_keys[(name, index)]
+            mapping = {}
+            for resource in resources.values():
+                for item in key(resource):
+                    mapping.setdefault(item, []).append(resource)
+            self._indexes[(name, index)] = (resources, mapping)
+        return list(mapping.get(value, []))
+
+    def invalidate(self, name=None):
+        """Drop snapshot of resource type (or of all types)"""
+        if name is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(name, None)
+
+    def watch(self, name):
+        """Return watch for resource type to pass to `common.wait`
+
+        :rtype: ResourceWatch
+        """
+        if name not in self.listers:
+            raise ValueError('Unknown resource type {0!r}'.format(name))
+        return ResourceWatch(self, name)
+
+
+class ResourceWatch(object):
+    """Resource type of ResourceWatcher
+
+    `common.wait` calls predicate with snapshot of resources ({id:
+    resource}) instead of without arguments if watch is passed to it.
+    """
+
+    def __init__(self, watcher, name):
+        self.watcher = watcher
+        self.name = name
+
+    def __repr__(self):
+        return '<ResourceWatch {0}>'.format(self.name)
+
+    @property
+    def interval(self):
+        return self.watcher.interval
+
+    def snapshot(self, not_before=None):
+        return self.watcher.snapshot(self.name, not_before=not_before)
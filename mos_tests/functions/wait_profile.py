@@ -0,0 +1,106 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import defaultdict
+import threading
+
+
+class WaitRecord(object):
+    """Single `common.wait` call
+
+    :param call_site: 'module:line' of wait caller
+    :param waiting_for: waited event description
+    :param duration: waiting time (in seconds)
+    :param polls: count of predicate calls
+    :param outcome: 'ok', 'timeout' or 'error'
+    :param test: nodeid of test running during wait (None out of tests)
+    """
+
+    def __init__(self, call_site, waiting_for, duration, polls, outcome,
+                 test=None):
+        self.call_site = call_site
+        self.waiting_for = waiting_for
+        self.duration = duration
+        self.polls = polls
+        self.outcome = outcome
+        self.test = test
+
+    def to_dict(self):
+        return {
+            'call_site': self.call_site,
+            'waiting_for': self.waiting_for,
+            'duration': self.duration,
+            'polls': self.polls,
+            'outcome': self.outcome,
+            'test': self.test,
+        }
+
+
+class WaitRegistry(object):
+    """Records of all waits made during session"""
+
+    def __init__(self):
+        self.records = []
+        self.current_test = None
+        self._lock = threading.Lock()
+
+    def add(self, call_site, waiting_for, duration, polls, outcome):
+        record = WaitRecord(call_site, waiting_for, duration, polls, outcome,
+                            test=self.current_test)
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def extend(self, records):
+        """Add records from dicts (made by `WaitRecord.to_dict`)"""
+        with self._lock:
+            self.records.extend(WaitRecord(**x) for x in records)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def by_call_site(self):
+        """Return aggregated stats as {call_site: stats dict}"""
+        stats = defaultdict(lambda: {'count': 0, 'duration': 0, 'max': 0,
+                                     'polls': 0, 'timeouts': 0,
+                                     'waiting_for': None})
+        for record in self.records:
+            item = stats[record.call_site]
+            item['count'] += 1
+            item['duration'] += record.duration
+            item['max'] = max(item['max'], record.duration)
+            item['polls'] += record.polls
+            item['timeouts'] += record.outcome == 'timeout'
+            item['waiting_for'] = record.waiting_for
+        return dict(stats)
+
+    def by_test(self):
+        """Return total waiting time for each test as {test: duration}"""
+        durations = defaultdict(float)
+        for record in self.records:
+            durations[record.test] += record.duration
+        return dict(durations)
+
+    def report(self):
+        """Return JSON-serializable report"""
+        return {
+            'records': [x.to_dict() for x in self.records],
+            'call_sites': self.by_call_site(),
+            'tests': self.by_test(),
+            'total': sum(x.duration for x in self.records),
+        }
+
+
+registry = WaitRegistry()
@@ -14,8 +14,8 @@
 
 import logging
 
-from mos_tests.functions.common import gen_random_resource_name
 from mos_tests.functions.common import wait
+from mos_tests.functions.log_cursor import LogCursor
 
 
 logger = logging.getLogger(__name__)
@@ -68,41 +68,24 @@ def ban_dhcp_agent(os_conn, env, node_to_ban, host, network_name=None,
     return node_to_ban
 
 
-def check_neutron_logs(controllers_list, logs_path, logs_start_marker,
-                       log_msg):
-    """Check neutron log, search for ERRORS.
+def check_neutron_logs(log_cursor, log_msg):
+    """Check that message is absent in neutron log written during the test
 
-    Ban dhcp agent on same node as network placed and wait until agents
-    rescheduling.
-
-    :param controllers_list: list of controllers which we check logs on
-    :param logs_path: path to the log file
-    :param logs_start_marker: place where log of this test starts
+    :param log_cursor: LogCursor returned by `mark_neutron_logs`
     :param log_msg: message to search
     :returns: -
     """
     logger.debug("Verify that the error log is absent in {}".format(
-        logs_path))
-    for controller in controllers_list:
-        with controller.ssh() as remote:
-            with remote.open(logs_path) as f:
-                # check only generated during the test logs
-                lines = iter(f)
-                for line in lines:
-                    if logs_start_marker in line:
-                        break
-                for line in lines:
-                    assert log_msg not in line
+        log_cursor.path))
+    found = {host: lines for host, lines in log_cursor.grep(
+        log_msg, max_count=10).items() if lines}
+    assert not found, "'{0}' is found in {1}: {2}".format(
+        log_msg, log_cursor.path, found)
 
 
 def mark_neutron_logs(controllers):
-    """Mark logs to know which logs are generated during the test"""
-    logs_path = "/var/log/neutron/server.log"
-    logs_start_marker = gen_random_resource_name(
-        prefix='neutron')
-
-    for controller in controllers:
-        with controller.ssh() as remote:
-            remote.check_call("echo {0} >> {1}".format(logs_start_marker,
-                                                       logs_path))
-    return logs_path, logs_start_marker
+    """Mark logs to know which logs are generated during the test
+
+    :returns: LogCursor for neutron server log on controllers
+    """
+    return LogCursor(controllers, "/var/log/neutron/server.log")
@@ -21,6 +21,7 @@ from neutronclient.common.exceptions import NeutronClientException
 import neutronclient.v2_0.client as neutronclient
 import pytest
 
+from mos_tests.environment.ssh import ssh_pool
 from mos_tests.functions.common import wait
 from mos_tests.functions import network_checks
 from mos_tests.neutron.python_tests import base
@@ -48,8 +49,10 @@ class TestDVRBase(base.TestBase):
         for hostname in hostnames:
             node = self.env.find_node_by_fqdn(hostname)
             devops_node = devops_env.get_node_by_fuel_node(node)
+            ssh_pool.evict(node.data['ip'])
             devops_node.destroy()
             devops_node.start()
+        self.env.invalidate_nodes()
 
         def get_agents_on_hosts():
             agents = self.os_conn.neutron.list_agents()['agents']
@@ -1288,7 +1291,7 @@ class TestDVRRegression(TestDVRBase):
                 gateway port for subnet' didn't appear in logs
         """
         controllers = self.env.get_nodes_by_role('controller')
-        logs_path, logs_start_marker = func.mark_neutron_logs(controllers)
+        log_cursor = func.mark_neutron_logs(controllers)
 
         net, _ = self.create_internal_network_with_subnet(1)
         router = self.os_conn.create_router(name='router01', distributed=True)
@@ -1299,8 +1302,7 @@ class TestDVRRegression(TestDVRBase):
         time.sleep(30)
 
         log_msg = "Could not retrieve gateway port for subnet"
-        func.check_neutron_logs(controllers, logs_path, logs_start_marker,
-                                log_msg)
+        func.check_neutron_logs(log_cursor, log_msg)
 
     @pytest.mark.testrail_id('844801')
     def test_check_router_namespace_on_compute_node(self):
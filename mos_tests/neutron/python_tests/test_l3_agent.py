@@ -556,7 +556,7 @@ class TestL3Agent(TestBase):
         [Bug] - https://bugs.launchpad.net/mos/+bug/1493754
         """
         controllers = self.env.get_nodes_by_role('controller')
-        logs_path, logs_start_marker = func.mark_neutron_logs(controllers)
+        log_cursor = func.mark_neutron_logs(controllers)
 
         router = self.os_conn.neutron.list_routers(
             name='router01')['routers'][0]
@@ -587,5 +587,4 @@ class TestL3Agent(TestBase):
                           wait_for_migrate=False)
 
         err_trace = "ERROR neutron.db.l3_agentschedulers_db"
-        func.check_neutron_logs(controllers, logs_path, logs_start_marker,
-                                err_trace)
+        func.check_neutron_logs(log_cursor, err_trace)
@@ -45,7 +45,7 @@ def run_test(path, node):
     filename = os.path.basename(path)
     with node.ssh() as remote:
         logger.info('Executing {}'.format(filename))
-        remote.upload(path, filename)
+        remote.upload(path, filename, sync='checksum')
         remote.check_call('chmod a+x {}'.format(filename))
         result = remote.execute('./{} 2>&1'.format(filename))
         logger.info('Stdout:')
@@ -144,6 +144,7 @@ class TestBaseNFV(object):
             devops_node.suspend()
         else:
             devops_node.resume()
+        os_conn.env.invalidate_nodes()
         common.wait(is_compute_state,
                     timeout_seconds=20 * 60,
                     waiting_for='compute is {}'.format(state))
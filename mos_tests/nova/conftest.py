@@ -62,20 +62,14 @@ def instances(request, os_conn, security_group, keypair, network):
     """Some instances (2 by default) on one compute node at one network"""
     zone = os_conn.nova.availability_zones.find(zoneName="nova")
     compute_host = zone.hosts.keys()[0]
-    instances = []
     param = getattr(request, 'param', {'count': 2})
-    for i in range(param['count']):
-        instance = os_conn.create_server(
-            name='server%02d' % i,
-            availability_zone='{}:{}'.format(zone.zoneName, compute_host),
-            key_name=keypair.name,
-            nics=[{'net-id': network['network']['id']}],
-            security_groups=[security_group.id],
-            wait_for_active=False,
-            wait_for_avaliable=False)
-        instances.append(instance)
-    os_conn.wait_servers_active(instances)
-    os_conn.wait_servers_ssh_ready(instances)
+    instances = os_conn.create_servers(
+        name='server',
+        count=param['count'],
+        availability_zone='{}:{}'.format(zone.zoneName, compute_host),
+        key_name=keypair.name,
+        nics=[{'net-id': network['network']['id']}],
+        security_groups=[security_group.id])
 
     yield instances
     if 'undestructive' in request.node.keywords:
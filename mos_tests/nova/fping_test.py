@@ -25,6 +25,30 @@ from mos_tests.neutron.python_tests.base import TestBase
 logger = logging.getLogger(__name__)
 
 
+def boot_on_computes(os_conn, name, zone_name, compute_hosts, count,
+                     **kwargs):
+    """Boot instances evenly on computes and wait them to be ready
+
+    Instances for each compute are booted with one request.
+
+    :returns: list of instances, each next is on next compute (round robin)
+    """
+    per_compute = []
+    for i, compute in enumerate(compute_hosts):
+        compute_count = len(range(i, count, len(compute_hosts)))
+        if compute_count == 0:
+            continue
+        per_compute.append(os_conn.create_servers(
+            name=name,
+            count=compute_count,
+            availability_zone='{}:{}'.format(zone_name, compute),
+            wait_for_active=False,
+            **kwargs))
+    instances = [per_compute[i % len(per_compute)][i // len(per_compute)]
+                 for i in range(count)]
+    return os_conn.wait_servers_ready(instances)
+
+
 @pytest.yield_fixture
 def instances_on_diff_computes(
         request, os_conn, security_group, keypair):
@@ -41,22 +65,11 @@ def instances_on_diff_computes(
     netid = [net['id'] for net in nets if not net['router:external'] and
              net['name'] == 'admin_internal_net'][0]
 
-    instances = []
-    for i in range(param['count']):
-        compute = compute_hosts.pop(0)
-        compute_hosts.append(compute)  # add back in list pop-ed value
-        # create instances
-        instance = os_conn.create_server(
-            name='server%02d' % i,
-            availability_zone='{}:{}'.format(zone.zoneName, compute),
-            key_name=keypair.name,
-            nics=[{'net-id': netid}],
-            security_groups=[security_group.id],
-            wait_for_active=False,
-            wait_for_avaliable=False)
-        instances.append(instance)
-    os_conn.wait_servers_active(instances)
-    os_conn.wait_servers_ssh_ready(instances)
+    instances = boot_on_computes(os_conn, 'server', zone.zoneName,
+                                 compute_hosts, param['count'],
+                                 key_name=keypair.name,
+                                 nics=[{'net-id': netid}],
+                                 security_groups=[security_group.id])
     # add floating IP to each instance
     floating_ips = []
     for instance in instances:
@@ -67,10 +80,7 @@ def instances_on_diff_computes(
     if 'undestructive' in request.node.keywords:
         for instance in instances:
             instance.force_delete()
-        common_functions.wait(
-            lambda: all(os_conn.is_server_deleted(x.id) for x in instances),
-            timeout_seconds=60,
-            waiting_for='instances to be deleted')
+        os_conn.wait_servers_deleted(instances, timeout=60)
         for fip in floating_ips:
             os_conn.delete_floating_ip(fip)
 
@@ -137,22 +147,11 @@ def newten_instances_on_diff_computes(
     netid = [net['id'] for net in nets if not net['router:external'] and
              net['name'] == 'admin_internal_net'][0]
 
-    instances = []
-    for i in range(param['count']):
-        compute = compute_hosts.pop(0)
-        compute_hosts.append(compute)  # add back in list pop-ed value
-        # create instances
-        instance = newten_os_conn.create_server(
-            name='newprj_server%02d' % i,
-            availability_zone='{}:{}'.format(zone.zoneName, compute),
-            key_name=keypair.name,
-            nics=[{'net-id': netid}],
-            security_groups=[security_group.id],
-            wait_for_active=False,
-            wait_for_avaliable=False)
-        instances.append(instance)
-    newten_os_conn.wait_servers_active(instances)
-    newten_os_conn.wait_servers_ssh_ready(instances)
+    instances = boot_on_computes(newten_os_conn, 'newprj_server',
+                                 zone.zoneName, compute_hosts,
+                                 param['count'], key_name=keypair.name,
+                                 nics=[{'net-id': netid}],
+                                 security_groups=[security_group.id])
     # add floating IP to each instance
     floating_ips = []
     for instance in instances:
@@ -162,10 +161,7 @@ def newten_instances_on_diff_computes(
     yield instances
     for instance in instances:
         instance.force_delete()
-    common_functions.wait(
-        lambda: all(newten_os_conn.is_server_deleted(x.id) for x in instances),
-        timeout_seconds=60,
-        waiting_for='instances to be deleted')
+    newten_os_conn.wait_servers_deleted(instances, timeout=60)
     for fip in floating_ips:
         newten_os_conn.delete_floating_ip(fip)
 
@@ -267,11 +263,8 @@ class TestNovaOSfpingExtension(TestBase):
             vm.stop()
 
         # Wait for servers power off
-        common_functions.wait(
-            lambda: all(self.os_conn.server_status_is(x, 'SHUTOFF')
-                        for x in vms_for_operations),
-            timeout_seconds=timeout, sleep_seconds=5,
-            waiting_for='instances to change status to SHUTOFF')
+        self.os_conn.wait_servers_status(vms_for_operations, 'SHUTOFF',
+                                         timeout=timeout, sleep_seconds=5)
 
         # Get fping results
         fping_list = self.os_conn.nova.fping.list()
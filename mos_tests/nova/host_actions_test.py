@@ -15,7 +15,6 @@
 import dpath.util
 import pytest
 
-from mos_tests.functions import common
 from mos_tests.functions import network_checks
 from mos_tests.functions import os_cli
 
@@ -64,9 +63,7 @@ def test_live_evacuate_instances(instances, os_conn, env, keypair,
             old_host=old_host,
             new_host=new_host))
 
-    common.wait(lambda: all([os_conn.is_server_active(x) for x in instances]),
-                timeout_seconds=2 * 60,
-                waiting_for='instances became to ACTIVE status')
+    os_conn.wait_servers_active(instances, timeout=2 * 60)
 
     for instance in instances:
         instance.get()
@@ -104,10 +101,7 @@ def test_migrate_instances(instances, os_conn, env, keypair, nova_client):
     old_host = getattr(instances[0], 'OS-EXT-SRV-ATTR:host')
     nova_client('host-servers-migrate', params=old_host)
 
-    common.wait(lambda: all([os_conn.server_status_is(x, 'VERIFY_RESIZE')
-                             for x in instances]),
-                timeout_seconds=2 * 60,
-                waiting_for='instances became to VERIFY_RESIZE status')
+    os_conn.wait_servers_status(instances, 'VERIFY_RESIZE', timeout=2 * 60)
 
     for instance in instances:
         instance.get()
@@ -116,9 +110,7 @@ def test_migrate_instances(instances, os_conn, env, keypair, nova_client):
     for instance in instances:
         instance.confirm_resize()
 
-    common.wait(lambda: all([os_conn.is_server_active(x) for x in instances]),
-                timeout_seconds=2 * 60,
-                waiting_for='instances became to ACTIVE status')
+    os_conn.wait_servers_active(instances, timeout=2 * 60)
 
     for instance in instances:
         ips = [os_conn.get_nova_instance_ips(x)['fixed']
@@ -194,9 +186,7 @@ def test_compute_resources_info(os_conn, env, keypair, nova_client, request):
             wait_for_avaliable=False)
         instances.append(instance)
 
-    common.wait(lambda: all(os_conn.is_server_active(x) for x in instances),
-                timeout_seconds=2 * 60,
-                waiting_for='instances to became to ACTIVE status')
+    os_conn.wait_servers_active(instances, timeout=2 * 60)
 
     data = nova_client('host-describe', params=host2).listing()
     host2_data = {x['PROJECT']: x for x in data}
@@ -247,9 +237,7 @@ def test_put_metadata(instances, os_conn, env, keypair, nova_client, network,
             wait_for_avaliable=False)
         instances.append(instance)
 
-    common.wait(lambda: all(os_conn.is_server_active(x) for x in instances),
-                timeout_seconds=2 * 60,
-                waiting_for='instances to became to ACTIVE status')
+    os_conn.wait_servers_active(instances, timeout=2 * 60)
 
     nova_client('host-meta', params='{host} set key=test'.format(host=host1))
 
@@ -62,14 +62,19 @@ def cleanup_virsh_domains(env, os_conn):
         host = getattr(instance, 'OS-EXT-SRV-ATTR:hypervisor_hostname')
         exists[host].add(getattr(instance, 'OS-EXT-SRV-ATTR:instance_name'))
     yield
-    for node in env.get_nodes_by_role('compute'):
+    computes = env.get_nodes_by_role('compute')
+    results = env.execute_on_nodes(computes,
+                                   "virsh list | grep running | "
+                                   "awk '{ print $2 }'")
+    for node in computes:
+        result = results[node.data['ip']]
+        if not result.is_ok:
+            continue
+        vms = set(result.stdout_string.split())
+        new_vms = vms - exists.get(node.data['fqdn'], set())
+        if not new_vms:
+            continue
         with node.ssh() as remote:
-            result = remote.execute("virsh list | grep running | "
-                                    "awk '{ print $2 }'")
-            if not result.is_ok:
-                continue
-            vms = set(result.stdout_string.split())
-            new_vms = vms - exists.get(node.data['fqdn'], set())
             for vm in new_vms:
                 remote.execute('virsh destroy {0}'.format(vm))
 
@@ -212,11 +217,7 @@ class TestLiveMigrationBase(object):
                 instance.delete()
             except nova_exceptions.NotFound:
                 pass
-        common.wait(
-            lambda: all(self.os_conn.is_server_deleted(x.id)
-                        for x in self.instances),
-            timeout_seconds=2 * 60,
-            waiting_for='instances to be deleted')
+        self.os_conn.wait_servers_deleted(self.instances, timeout=2 * 60)
         self.instances = []
         for hypervisor in self.os_conn.nova.hypervisors.list():
             if hypervisor.hypervisor_hostname in hypervisors:
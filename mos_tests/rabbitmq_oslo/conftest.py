@@ -25,28 +25,22 @@ logger = logging.getLogger(__name__)
 @pytest.yield_fixture
 def fixt_open_tool_port_on_nodes(env):
     """Required to be able to send GET request from non management IP"""
-    for node in env.get_all_nodes():
-        with node.ssh() as remote:
-            cmd = 'iptables -A INPUT -p tcp --dport %s -j ACCEPT' % \
-                  settings.RABBITOSLO_TOOL_PORT
-            remote.check_call(cmd)
+    nodes = env.get_all_nodes()
+    cmd = 'iptables -A INPUT -p tcp --dport %s -j ACCEPT' % \
+          settings.RABBITOSLO_TOOL_PORT
+    env.execute_on_nodes(nodes, cmd).check()
     yield
-    for node in env.get_all_nodes():
-        with node.ssh() as remote:
-            # delete rule
-            cmd = 'iptables -D INPUT -p tcp --dport %s -j ACCEPT' % \
-                  settings.RABBITOSLO_TOOL_PORT
-            remote.check_call(cmd)
+    # delete rule
+    cmd = 'iptables -D INPUT -p tcp --dport %s -j ACCEPT' % \
+          settings.RABBITOSLO_TOOL_PORT
+    env.execute_on_nodes(nodes, cmd).check()
 
 
 @pytest.yield_fixture
 def fixt_kill_rpc_server_client(env):
     """Stop oslo_msg_check_server AND oslo_msg_check_client after test"""
     yield
-    for node in env.get_all_nodes():
-        with node.ssh() as remote:
-            cmd = 'pkill -f oslo_msg_check_'
-            remote.execute(cmd)
+    env.execute_on_nodes(env.get_all_nodes(), 'pkill -f oslo_msg_check_')
 
 
 @pytest.fixture
@@ -33,6 +33,9 @@ KEYSTONE_CREDS = {'username': KEYSTONE_USER,
 
 PUBLIC_TEST_IP = os.environ.get('PUBLIC_TEST_IP', '8.8.8.8')
 
+# Path to folder with Keystone tokens cache
+TOKEN_CACHE_PATH = os.environ.get("TOKEN_CACHE_PATH", os.path.expanduser('~/.cache/mos_tests/tokens'))  # noqa
+
 # Path to folder with required images
 TEST_IMAGE_PATH = os.environ.get("TEST_IMAGE_PATH", os.path.expanduser('~/images'))  # noqa
 UBUNTU_QCOW2_URL = 'https://cloud-images.ubuntu.com/trusty/current/trusty-server-cloudimg-amd64-disk1.img'  # noqa
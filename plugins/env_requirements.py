@@ -0,0 +1,122 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+__doc__ = """This module evaluates `check_env_` requirements of tests.
+
+Requirement is an expression of guards (functions with env argument, which
+names start with `is_` or `has_`):
+
+@pytest.mark.check_env_('is_ha', 'not is_ceph_enabled')
+def test_smth():
+    pass
+
+Results of guards and requirements (and cluster settings) are cached in
+`env_checks_cache` until it is cleared (after snapshot revert).
+"""
+
+logger = logging.getLogger(__name__)
+
+env_checks_cache = {}
+
+
+def get_editable_settings(env):
+    """Returns editable cluster settings"""
+    if 'settings' not in env_checks_cache:
+        data = env.get_settings_data()['editable']
+        env_checks_cache['settings'] = data
+    return env_checks_cache['settings']
+
+
+def get_marker(item, name):
+    # get_marker is replaced by get_closest_marker in new pytest versions
+    get_item_marker = (getattr(item, 'get_closest_marker', None) or
+                       item.get_marker)
+    return get_item_marker(name)
+
+
+def get_guard_result(env, name, guards):
+    """Evaluate guard function once (until cache is cleared)
+
+    :param guards: dict with guard functions (module globals, for example)
+    """
+    key = ('guard', name)
+    if key not in env_checks_cache:
+        function = guards.get(name)
+        if function is None:
+            logger.critical('Guard with name {} not found'.format(name))
+            raise ValueError('Parse error')
+        if not (name.startswith('is_') or name.startswith('has_')):
+            logger.critical(
+                'Guard must start with "is_" or "has_", got {} instead'.format(
+                    name))
+            raise ValueError('Parse error')
+        env_checks_cache[key] = function(env)
+    return env_checks_cache[key]
+
+
+def check_env_requirements(env, marker_args, guards):
+    """Evaluate check_env_ marker arguments
+
+    :returns: tuple (is requirements met, requirements string,
+        evaluated requirements string)
+    """
+    reserved = {'or', 'and', 'not', '(', ')'}
+    marker_str = ' and '.join(marker_args)
+    key = ('requirements', marker_str)
+    if key in env_checks_cache:
+        return env_checks_cache[key]
+    marker_str = marker_str.replace(
+        '(', ' ( '
+    ).replace(
+        ')', ' ) '
+    ).replace(
+        '  ', ' ')
+    functions = marker_str.split()
+    marker_str_evalued = marker_str
+    for func in functions:
+        if func in reserved:
+            continue
+        marker_str_evalued = marker_str_evalued.replace(
+            func, str(get_guard_result(env, func, guards)))
+
+    result = (eval(marker_str_evalued), marker_str, marker_str_evalued)
+    env_checks_cache[key] = result
+    return result
+
+
+def deselect_unsupported(config, items, env, guards):
+    """Deselect items, which env doesn't meet requirements
+
+    Items, which requirements can't be evaluated, are kept to be checked
+    before test run.
+    """
+    selected, deselected = [], []
+    for item in items:
+        marker = get_marker(item, 'check_env_')
+        try:
+            is_met = (marker is None or
+                      check_env_requirements(env, marker.args, guards)[0])
+        except Exception as e:
+            logger.warning("Can't check requirements of {0}: {1}".format(
+                item.nodeid, e))
+            is_met = True
+        if is_met:
+            selected.append(item)
+        else:
+            deselected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
@@ -0,0 +1,168 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+
+import pytest
+
+__doc__ = """This module reorders tests to make less snapshot reverts.
+
+Undestructive tests (marked with `undestructive`) of each module are run
+first on pristine env, destructive ones are run after them. Destructive
+tests, which may be run on env left by each other, should be marked with
+same revert group:
+
+@pytest.mark.revert_group('computes_reboot')
+def test_a():
+    pass
+
+@pytest.mark.revert_group('computes_reboot')
+def test_b():
+    pass
+
+Tests of one group are run one after another and env is reverted only
+after the last of them. Tests of one class are kept together, tests are
+not moved between modules.
+Run with `--keep-order` to disable reordering.
+"""
+
+
+class RevertStats(object):
+    """Counters of snapshot reverts made during session"""
+
+    def __init__(self):
+        self.reverts = 0
+        # count of tests, each of them is reverted after without groups
+        self.needed = 0
+        # planned reverts count for collected and reordered tests
+        self.planned_before = None
+        self.planned_after = None
+
+    @property
+    def saved(self):
+        return self.needed - self.reverts
+
+
+stats = RevertStats()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--keep-order", action="store_true",
+                     help="Don't reorder tests to make less reverts")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers",
+                            "revert_group(name): destructive tests of group "
+                            "share one snapshot revert")
+
+
+def is_destructive(item):
+    return 'undestructive' not in item.keywords
+
+
+def get_revert_group(item):
+    # get_marker is replaced by get_closest_marker in new pytest versions
+    get_marker = getattr(item, 'get_closest_marker', None) or item.get_marker
+    marker = get_marker('revert_group')
+    if marker is None:
+        return None
+    return marker.args[0]
+
+
+def can_share_revert(item, nextitem):
+    """Returns True if env may be not reverted between tests"""
+    if nextitem is None or not is_destructive(nextitem):
+        return False
+    group = get_revert_group(item)
+    return group is not None and group == get_revert_group(nextitem)
+
+
+def count_planned_reverts(items):
+    return sum(1 for item, nextitem in zip(items, items[1:])
+               if is_destructive(item) and
+               not can_share_revert(item, nextitem))
+
+
+def _units(items):
+    """Split items to units (classes or single tests) to move together"""
+    units = []
+    last_key = None
+    for item in items:
+        cls = item.getparent(pytest.Class)
+        key = cls if cls is not None else item
+        if units and key is last_key:
+            units[-1].append(item)
+        else:
+            units.append([item])
+        last_key = key
+    return units
+
+
+def _unit_group(unit):
+    groups = set(get_revert_group(x) for x in unit)
+    if len(groups) == 1:
+        return groups.pop()
+
+
+def _modules(items):
+    """Split items to modules (items are not moved between modules to keep
+    module scoped fixtures set up once)"""
+    modules = []
+    last_module = None
+    for item in items:
+        module = item.getparent(pytest.Module)
+        if modules and module is last_module:
+            modules[-1].append(item)
+        else:
+            modules.append([item])
+        last_module = module
+    return modules
+
+
+def _reorder_module(items):
+    undestructive = []
+    destructive = OrderedDict()
+    for unit in _units(items):
+        if not any(is_destructive(x) for x in unit):
+            undestructive.extend(unit)
+            continue
+        group = _unit_group(unit)
+        # units of group are moved to the first of them, units without
+        # group keep their order
+        key = group if group is not None else id(unit)
+        destructive.setdefault(key, []).extend(unit)
+    return undestructive + [x for unit in destructive.values()
+                            for x in unit]
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    stats.planned_before = count_planned_reverts(items)
+    if config.getoption("--keep-order"):
+        stats.planned_after = stats.planned_before
+        return
+    items[:] = [x for module in _modules(items)
+                for x in _reorder_module(module)]
+    stats.planned_after = count_planned_reverts(items)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if stats.planned_before is None or not (stats.needed or stats.reverts):
+        return
+    terminalreporter.write_sep('=', 'snapshot reverts: {0} made, {1} saved'
+                               .format(stats.reverts, stats.saved))
+    terminalreporter.write_line(
+        'planned reverts: {0} in collected order, {1} after '
+        'reordering'.format(stats.planned_before, stats.planned_after))
@@ -0,0 +1,133 @@
+import pytest
+
+from plugins import env_requirements
+from plugins.env_requirements import check_env_requirements
+from plugins.env_requirements import get_editable_settings
+
+pytest_plugins = "pytester"
+
+
+class FakeEnv(object):
+    def __init__(self, ceph=True):
+        self.ceph = ceph
+        self.settings_calls = 0
+
+    def get_settings_data(self):
+        self.settings_calls += 1
+        return {'editable': {'storage': {'volumes_ceph': {
+            'value': self.ceph}}}}
+
+
+def is_ceph_enabled(env):
+    return get_editable_settings(env)['storage']['volumes_ceph']['value']
+
+
+def has_2_or_more_computes(env):
+    env.computes_calls = getattr(env, 'computes_calls', 0) + 1
+    return False
+
+
+def wrong_guard(env):
+    return True
+
+
+guards = {
+    'is_ceph_enabled': is_ceph_enabled,
+    'has_2_or_more_computes': has_2_or_more_computes,
+    'wrong_guard': wrong_guard,
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    env_requirements.env_checks_cache.clear()
+    yield
+    env_requirements.env_checks_cache.clear()
+
+
+def test_settings_guard():
+    env = FakeEnv()
+    assert check_env_requirements(env, ['is_ceph_enabled'], guards) == (
+        True, 'is_ceph_enabled', 'True')
+    assert check_env_requirements(env, ['not is_ceph_enabled'],
+                                  guards)[0] is False
+    assert env.settings_calls == 1
+
+
+def test_guards_cached():
+    env = FakeEnv()
+    for _ in range(3):
+        result = check_env_requirements(
+            env, ['is_ceph_enabled', 'has_2_or_more_computes'], guards)
+        assert result[0] is False
+        check_env_requirements(env, ['has_2_or_more_computes or '
+                                     'is_ceph_enabled'], guards)
+    assert env.settings_calls == 1
+    assert env.computes_calls == 1
+
+
+def test_cache_cleared():
+    env = FakeEnv(ceph=True)
+    assert check_env_requirements(env, ['is_ceph_enabled'], guards)[0]
+    env_requirements.env_checks_cache.clear()
+    env.ceph = False
+    assert not check_env_requirements(env, ['is_ceph_enabled'], guards)[0]
+    assert env.settings_calls == 2
+
+
+@pytest.mark.parametrize('name', ['wrong_guard', 'is_absent'])
+def test_wrong_guard(name):
+    with pytest.raises(ValueError):
+        check_env_requirements(FakeEnv(), [name], guards)
+
+
+def test_deselect(testdir):
+    testdir.makeconftest("""
+        from plugins.env_requirements import deselect_unsupported
+        from plugins.env_requirements import get_editable_settings
+
+
+        class FakeEnv(object):
+            def get_settings_data(self):
+                return {'editable': {'storage': {'volumes_ceph': {
+                    'value': False}}}}
+
+
+        def is_ceph_enabled(env):
+            data = get_editable_settings(env)['storage']
+            return data['volumes_ceph']['value']
+
+
+        def is_broken(env):
+            raise Exception('env is unavailable')
+
+
+        def pytest_collection_modifyitems(session, config, items):
+            deselect_unsupported(config, items, FakeEnv(), globals())
+    """)
+    testdir.makepyfile("""
+        import pytest
+
+        @pytest.mark.check_env_('is_ceph_enabled')
+        def test_ceph():
+            pass
+
+        @pytest.mark.check_env_('not is_ceph_enabled')
+        def test_no_ceph():
+            pass
+
+        @pytest.mark.check_env_('is_broken')
+        def test_broken():
+            pass
+
+        def test_without_requirements():
+            pass
+    """)
+    result = testdir.runpytest("-v")
+    result.stdout.fnmatch_lines([
+        "*::test_no_ceph PASSED*",
+        "*::test_broken PASSED*",
+        "*::test_without_requirements PASSED*",
+        "*3 passed, 1 deselected*",
+    ])
+    assert 'test_ceph PASSED' not in result.stdout.str()
@@ -0,0 +1,115 @@
+pytest_plugins = "pytester"
+
+
+def test_reorder(testdir):
+    testdir.makepyfile("""
+        import pytest
+
+        def test_d1():
+            pass
+
+        @pytest.mark.undestructive
+        def test_u1():
+            pass
+
+        @pytest.mark.revert_group('reboot')
+        def test_g1():
+            pass
+
+        def test_d2():
+            pass
+
+        @pytest.mark.revert_group('reboot')
+        def test_g2():
+            pass
+
+        class TestClass(object):
+            @pytest.mark.undestructive
+            def test_a(self):
+                pass
+
+            def test_b(self):
+                pass
+
+        @pytest.mark.undestructive
+        def test_u2():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.revert_scheduler", "-v")
+    result.stdout.fnmatch_lines([
+        "*::test_u1 PASSED*",
+        "*::test_u2 PASSED*",
+        "*::test_d1 PASSED*",
+        "*::test_g1 PASSED*",
+        "*::test_g2 PASSED*",
+        "*::test_d2 PASSED*",
+        "*::TestClass::test_a PASSED*",
+        "*::TestClass::test_b PASSED*",
+    ])
+
+
+def test_reorder_within_modules(testdir):
+    testdir.makeconftest("""
+        import pytest
+
+        setups = []
+
+        @pytest.fixture(scope='module')
+        def module_fixture(request):
+            setups.append(request.module.__name__)
+
+        def pytest_terminal_summary(terminalreporter):
+            terminalreporter.write_line('setups: {0}'.format(setups))
+    """)
+    test_module = """
+        import pytest
+
+        pytestmark = pytest.mark.usefixtures('module_fixture')
+
+        @pytest.mark.revert_group('reboot')
+        def test_g1():
+            pass
+
+        def test_d():
+            pass
+
+        @pytest.mark.undestructive
+        def test_u():
+            pass
+
+        @pytest.mark.revert_group('reboot')
+        def test_g2():
+            pass
+    """
+    testdir.makepyfile(test_a=test_module, test_b=test_module)
+    result = testdir.runpytest("-p", "plugins.revert_scheduler", "-v")
+    result.stdout.fnmatch_lines([
+        "test_a.py::test_u PASSED*",
+        "test_a.py::test_g1 PASSED*",
+        "test_a.py::test_g2 PASSED*",
+        "test_a.py::test_d PASSED*",
+        "test_b.py::test_u PASSED*",
+        "test_b.py::test_g1 PASSED*",
+        "test_b.py::test_g2 PASSED*",
+        "test_b.py::test_d PASSED*",
+        "setups: ['test_a', 'test_b']",
+    ])
+
+
+def test_keep_order(testdir):
+    testdir.makepyfile("""
+        def test_b():
+            pass
+
+        import pytest
+
+        @pytest.mark.undestructive
+        def test_a():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.revert_scheduler", "-v",
+                               "--keep-order")
+    result.stdout.fnmatch_lines([
+        "*::test_b PASSED*",
+        "*::test_a PASSED*",
+    ])
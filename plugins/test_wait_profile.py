@@ -0,0 +1,41 @@
+import json
+
+pytest_plugins = "pytester"
+
+
+def test_report(testdir):
+    testdir.makepyfile("""
+        from mos_tests.functions.wait_profile import registry
+
+        def test_a():
+            registry.add('mod:1', 'server', 5.0, 3, 'ok')
+            registry.add('mod:2', 'volume', 1.0, 1, 'timeout')
+
+        def test_b():
+            registry.add('mod:1', 'server', 7.0, 4, 'ok')
+    """)
+    result = testdir.runpytest("-p", "plugins.wait_profile",
+                               "--wait-profile=waits.json")
+    result.stdout.fnmatch_lines([
+        "*wait profile: 3 waits, 13.0s total*",
+        "*12.0*2*7.0*7*0*mod:1 (server)",
+        "*1.0*1*1.0*1*1*mod:2 (volume)",
+        "*tests with longest waits*",
+        "*7.0*test_report.py::test_b",
+        "*6.0*test_report.py::test_a",
+    ])
+    with open(str(testdir.tmpdir.join('waits.json'))) as f:
+        report = json.load(f)
+    assert len(report['records']) == 3
+    assert report['call_sites']['mod:1']['polls'] == 7
+    assert report['records'][0]['test'].endswith('::test_a')
+
+
+def test_no_report_without_option(testdir):
+    testdir.makepyfile("""
+        def test_a():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.wait_profile")
+    assert 'wait profile' not in result.stdout.str()
+    assert not testdir.tmpdir.join('waits.json').check()
@@ -0,0 +1,96 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import pytest
+
+from mos_tests.functions.wait_profile import registry
+
+__doc__ = """This module reports where tests spend time in `common.wait`.
+
+Run with `--wait-profile=waits.json` to save all waits (call site, event,
+duration, polls count, outcome and test) with aggregated stats to JSON
+file and to show slowest call sites and tests after the session.
+"""
+
+
+def pytest_addoption(parser):
+    parser.addoption("--wait-profile", action="store", metavar="PATH",
+                     help="Save waits profile to JSON file and show "
+                          "slowest waits")
+    parser.addoption("--wait-profile-top", action="store", type=int,
+                     default=10,
+                     help="Count of slowest waits to show (default: 10)")
+
+
+def pytest_sessionstart(session):
+    registry.clear()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    registry.current_test = item.nodeid
+    yield
+    registry.current_test = None
+
+
+def _worker_output(config):
+    # xdist worker (named slave in old xdist versions)
+    return getattr(config, 'workeroutput',
+                   getattr(config, 'slaveoutput', None))
+
+
+def pytest_sessionfinish(session):
+    output = _worker_output(session.config)
+    if output is not None:
+        output['wait_profile'] = [x.to_dict() for x in registry.records]
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    output = getattr(node, 'workeroutput',
+                     getattr(node, 'slaveoutput', {}))
+    registry.extend(output.get('wait_profile', []))
+
+
+def pytest_terminal_summary(terminalreporter):
+    config = terminalreporter.config
+    path = config.getoption("--wait-profile")
+    if not path or _worker_output(config) is not None:
+        return
+    report = registry.report()
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    top = config.getoption("--wait-profile-top")
+    tr = terminalreporter
+    tr.write_sep('=', 'wait profile: {0} waits, {1:.1f}s total'.format(
+        len(registry.records), report['total']))
+    tr.write_line('{0:>9} {1:>6} {2:>8} {3:>6} {4:>8}  {5}'.format(
+        'total, s', 'count', 'max, s', 'polls', 'timeouts', 'call site'))
+    call_sites = sorted(report['call_sites'].items(),
+                        key=lambda x: x[1]['duration'], reverse=True)
+    for call_site, stats in call_sites[:top]:
+        tr.write_line(
+            '{0[duration]:9.1f} {0[count]:6d} {0[max]:8.1f} {0[polls]:6d} '
+            '{0[timeouts]:8d}  {1} ({0[waiting_for]})'.format(stats,
+                                                              call_site))
+
+    tr.write_sep('-', 'tests with longest waits')
+    tests = sorted(report['tests'].items(), key=lambda x: x[1], reverse=True)
+    for test, duration in tests[:top]:
+        tr.write_line('{0:9.1f}  {1}'.format(duration,
+                                             test or '<out of tests>'))
+    tr.write_line('Wait profile is saved to {0}'.format(path))